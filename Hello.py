@@ -2,6 +2,9 @@
 
 import streamlit as st
 
+from utils.diagnostics import render_diagnostics
+from utils.prefetch import prefetch
+
 #%% webpage
 
 st.set_page_config(
@@ -9,6 +12,15 @@ st.set_page_config(
     page_icon="👋",
 )
 
+# hidden diagnostics page, not listed in the sidebar
+if 'diagnostics' in st.query_params:
+    render_diagnostics()
+    st.stop()
+
+# newest version of the real MP, master data and project tables are loaded in the background
+# while the landing page is read
+prefetch()
+
 st.write("# Bienvenido al MP EPM Guatemala! 👋")
 
 st.sidebar.success("Select a page")
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Payload size and build time of the MRP inventory chart, per-month traces vs single trace
+#
+# usage: python -m benchmarks.bench_mrp_chart [months ...]
+
+#%% Importing packages
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from utils.charts import build_mrp_figure, colors, mrp_inventory_path
+
+#%% Functions
+
+def synthetic_df_final(int_window, seed=0):
+    rng = np.random.default_rng(seed)
+    npa_final = rng.uniform(0, 500, int_window)
+    npa_purchase = rng.uniform(0, 200, int_window)
+    df_final = pd.DataFrame({
+        'inventory_initial_new&ra': np.r_[300.0, npa_final[:-1]] + npa_purchase,
+        'inventory_final_new&ra': npa_final,
+        'rp_inventory': rng.uniform(100, 200, int_window),
+        'ss_inventory': rng.uniform(50, 100, int_window),
+        'demand_min_stock': rng.uniform(0, 50, int_window)},
+        index=pd.period_range('2025-01', periods=int_window, freq='M').astype(str))
+    df_final.index.name = 'year_month'
+    return df_final
+
+def legacy_inventory_traces(fig_mrp, df_final):
+    # Previous implementation: 2x(n-1) two-point traces
+    col_index_dict = {col: idx for idx, col in enumerate(df_final.columns)}
+    npa_mrp = np.transpose(df_final.values)
+    int_window = npa_mrp.shape[1]
+    for j in range(int_window - 1):
+        fig_mrp.add_trace(go.Scatter(
+            x=[j, j],
+            y=[npa_mrp[col_index_dict['inventory_initial_new&ra'], j],
+               npa_mrp[col_index_dict['inventory_final_new&ra'], j]],
+            mode='lines',
+            line=dict(color=colors["inventory_line"], dash='dash', width=1),
+            name="Inventory Flow",
+            showlegend=(j == 0)
+        ))
+    for j in range(int_window - 1):
+        fig_mrp.add_trace(go.Scatter(
+            x=[j, j + 1],
+            y=[npa_mrp[col_index_dict['inventory_final_new&ra'], j],
+               npa_mrp[col_index_dict['inventory_initial_new&ra'], j + 1]],
+            mode='lines',
+            line=dict(color=colors["inventory_line"], dash='dash', width=1),
+            showlegend=False
+        ))
+
+def vectorized_inventory_traces(fig_mrp, df_final):
+    # Current implementation: one trace
+    npa_x, npa_y = mrp_inventory_path(df_final['inventory_initial_new&ra'].values,
+                                      df_final['inventory_final_new&ra'].values)
+    fig_mrp.add_trace(go.Scatter(
+        x=npa_x,
+        y=npa_y,
+        mode='lines',
+        line=dict(color=colors["inventory_line"], dash='dash', width=1),
+        name="Inventory Flow",
+        showlegend=True
+    ))
+
+def bench(add_traces, df_final, int_repeat=5):
+    # Build time of the inventory traces only (best of n), payload of the full figure
+    fig_mrp = build_mrp_figure(df_final, 'MRP')
+    ls_build = []
+    for _ in range(int_repeat):
+        t0 = time.perf_counter()
+        fig = go.Figure()
+        add_traces(fig, df_final)
+        ls_build.append(time.perf_counter() - t0)
+    fig.add_traces(list(fig_mrp.data[1:]))
+    fig.update_layout(fig_mrp.layout)
+    t0 = time.perf_counter()
+    str_json = fig.to_json()
+    flt_json = time.perf_counter() - t0
+    return len(fig.data), len(str_json), min(ls_build), flt_json
+
+#%% Main
+
+if __name__ == '__main__':
+    ls_windows = [int(elem) for elem in sys.argv[1:]] or [12, 48, 60, 120]
+    print(f"{'months':>6} {'builder':>10} {'traces':>6} {'json_kb':>8} {'build_ms':>9} {'json_ms':>8}")
+    for int_window in ls_windows:
+        df_final = synthetic_df_final(int_window)
+        for str_name, add_traces in [('legacy', legacy_inventory_traces), ('vectorized', vectorized_inventory_traces)]:
+            int_traces, int_bytes, flt_build, flt_json = bench(add_traces, df_final)
+            print(f'{int_window:>6} {str_name:>10} {int_traces:>6} {int_bytes/1024:>8.1f} '
+                  f'{flt_build*1000:>9.1f} {flt_json*1000:>8.1f}')
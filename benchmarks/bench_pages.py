@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# Load and transform time of each page, cold, from snapshots and from the cache
+#
+# usage: python -m benchmarks.bench_pages [--repeat 3] [--out results.csv] [--baseline results.csv]
+#
+# Runs against the [connections.postgresql] database of .streamlit/secrets.toml, point it
+# at a stand-in filled by benchmarks.generate_mp. Snapshots and exports go to a temporary
+# directory unless MP_SNAPSHOT_DIR / MP_EXPORT_DIR are set. Results go to stdout, the
+# streamlit warnings about running without a runtime go to stderr.
+
+#%% Importing packages
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+# the stores are read from the environment when utils is imported
+_tmp_dir = tempfile.mkdtemp(prefix='mp_bench_')
+os.environ.setdefault('MP_SNAPSHOT_DIR', os.path.join(_tmp_dir, 'snapshots'))
+os.environ.setdefault('MP_EXPORT_DIR', os.path.join(_tmp_dir, 'exports'))
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.catalog import get_versions_mp
+from utils.charts import build_mrp_figure
+from utils.compare import load_sku_deltas, load_version_deltas, sum_company_deltas
+from utils.exports import EXPORT_DIR, export_mp
+from utils.instrumentation import frame_stats
+from utils.loaders import (load_alerts_company_states, load_alerts_company_summary,
+                           load_alerts_family_summary, load_alerts_sku_states, load_company_schema,
+                           load_company_sums, load_data_mm, load_master_planned_skus, load_mp_sku,
+                           load_mp_skus, load_portfolio_sums)
+from utils.montecarlo import RISK_PATHS, estimate_stockout_risk, summarize_risk
+from utils.policy import compute_policy, load_policy_inputs, summarize_policy
+from utils.projects import load_projects_engine, lookup_rows
+from utils.simulation import (defer_purchases, load_base_simulation, load_simulation_inputs, simulate,
+                              summarize_simulation)
+from utils.schema import COMPANIES, sum_company_metrics
+from utils.snapshots import SNAPSHOT_DIR
+
+#%% Timer
+
+class StageTimer:
+    # Times the stages of a page and keeps one row per stage
+
+    def __init__(self):
+        self.rows = []
+        self.page = None
+        self.mode = None
+
+    def __call__(self, str_stage, func, *args, **kwargs):
+        t0 = time.perf_counter()
+        result = func(*args, **kwargs)
+        flt_seconds = time.perf_counter() - t0
+        int_rows, int_bytes = frame_stats(result)
+        self.rows.append({'page': self.page, 'stage': str_stage, 'mode': self.mode,
+                          'seconds': flt_seconds, 'rows': int_rows, 'bytes': int_bytes})
+        return result
+
+#%% Pages
+
+def page_inventory(timer, dict_sel):
+    df_pivot = timer('load_company_sums', load_company_sums, 'clean_real_mp', [dict_sel['version']],
+                     'inventory_initial_new&ra_valuation', 'year_month')
+    timer('transform', lambda: (df_pivot.set_index('year_month')/1000000).round(3).sum(axis=1))
+    timer('load_company_sums_year', load_company_sums, 'clean_real_mp', [dict_sel['version']],
+          'inventory_purchase_valuation', 'year')
+
+def page_material_master(timer, dict_sel):
+    df_mm = timer('load_data_mm', load_data_mm)
+
+    def transform():
+        df_clean = df_mm[((df_mm['mrp'] == 'si') | (df_mm['mto'] == 'si') | (df_mm['min_stock'] == 'si'))
+                         & (df_mm['obsoleto'] == 'no')].drop_duplicates(subset=['sap_codigo', 'sociedad'])
+        binary_matrix = pd.crosstab(df_clean['sap_codigo'], df_clean['sociedad'])
+        return binary_matrix.T.dot(binary_matrix)
+    timer('transform', transform)
+
+def page_alerts(timer, dict_sel):
+    ls_versions = [dict_sel['version']]
+    timer('load_alerts_company_states', load_alerts_company_states, 'clean_real_mp', ls_versions)
+    timer('load_alerts_sku_states', load_alerts_sku_states, 'clean_real_mp', ls_versions)
+    timer('load_alerts_company_summary', load_alerts_company_summary, 'clean_real_mp', ls_versions)
+    timer('load_alerts_family_summary', load_alerts_family_summary, 'clean_real_mp', ls_versions)
+    timer('load_master_planned_skus', load_master_planned_skus)
+
+def page_planning(timer, dict_sel, table):
+    ls_versions = [dict_sel['version']]
+    timer('load_mp_skus', load_mp_skus, table, ls_versions)
+    schema = timer('load_company_schema', load_company_schema, table)
+    data = timer('load_mp_sku', load_mp_sku, table, ls_versions, dict_sel['sku'])
+
+    def transform():
+        df_final = sum_company_metrics(data, schema, None)
+        df_final['year_month'] = data['year_month']
+        return df_final.set_index('year_month').sort_index()
+    df_final = timer('sum_company_metrics', transform)
+    timer('build_mrp_figure', build_mrp_figure, df_final, 'MRP')
+
+    if dict_sel['version_old']:
+        timer('load_version_deltas', load_version_deltas, table, dict_sel['version'], dict_sel['version_old'])
+        df_sku_deltas = timer('load_sku_deltas', load_sku_deltas, table,
+                              dict_sel['version'], dict_sel['version_old'], dict_sel['sku'])
+        timer('sum_company_deltas', sum_company_deltas, df_sku_deltas, schema, None)
+
+def page_procurement(timer, dict_sel):
+    schema = load_company_schema('clean_real_mp')
+    ls_cols = ['sku']
+    for str_company in COMPANIES:
+        for str_base in ['inventory_purchase', 'purchase_type', 'inventory_purchase_valuation']:
+            ls_cols.append(schema[str_base][str_company])
+    ls_cols.append('year_month')
+    timer('load_mp_sku', load_mp_sku, 'clean_real_mp', [dict_sel['version']], dict_sel['sku'], columns=ls_cols)
+
+def page_projects(timer, dict_sel):
+    engine = timer('load_projects_engine', load_projects_engine)
+    str_project = engine['project_options'][len(engine['project_options'])//2]
+    str_project_id, str_project_description = str_project.split('~', 1)
+    df_project = timer('lookup_rows', lookup_rows, engine, [('project_version', str_project_id),
+                                                            ('project_description', str_project_description)])
+    timer('pivot_table', pd.pivot_table, df_project, index=['sku', 'sku_description'], columns='type',
+          values='qty', aggfunc='sum', observed=True)
+
+def page_all_mp_data(timer, dict_sel):
+    timer('export_mp', export_mp, 'clean_real_mp', [dict_sel['version']])
+
+def page_portfolio(timer, dict_sel):
+    df_portfolio = timer('load_portfolio_sums', load_portfolio_sums, 'clean_real_mp', dict_sel['version'])
+    timer('build_mrp_figure', build_mrp_figure, df_portfolio.set_index('year_month'), 'MRP')
+    timer('load_portfolio_sums_family', load_portfolio_sums, 'clean_real_mp', dict_sel['version'],
+          by='sku_family')
+
+def page_whatif(timer, dict_sel):
+    dict_inputs = timer('load_policy_inputs', load_policy_inputs, 'clean_real_mp', dict_sel['version'])
+    dict_policy = timer('compute_policy', compute_policy, dict_inputs, 0.99, 0.95, 1.2, 1.0)
+    timer('summarize_policy', summarize_policy, dict_inputs, dict_policy)
+
+def page_simulator(timer, dict_sel):
+    dict_inputs = timer('load_simulation_inputs', load_simulation_inputs, 'clean_real_mp', dict_sel['version'])
+    dict_base = timer('load_base_simulation', load_base_simulation, 'clean_real_mp', dict_sel['version'])
+    npa_purchase = defer_purchases(dict_inputs['purchase'], 2, dict_inputs['months'][len(dict_inputs['months'])//4],
+                                   dict_inputs['months'])
+    dict_sim = timer('simulate', simulate, dict_inputs, npa_purchase)
+    timer('summarize_simulation', summarize_simulation, dict_inputs, dict_base, dict_sim)
+
+def page_risk(timer, dict_sel):
+    # a tenth of the page default paths, the sampling time is linear in the paths
+    dict_inputs = timer('load_simulation_inputs', load_simulation_inputs, 'clean_real_mp', dict_sel['version'])
+    dict_result = timer('estimate_stockout_risk', estimate_stockout_risk, dict_inputs, RISK_PATHS//10)
+    timer('summarize_risk', summarize_risk, dict_inputs, dict_result)
+
+# page, benchmark
+PAGES = [
+    ('2_Inventory_&_Purchase_amount', page_inventory),
+    ('3_Material_Master', page_material_master),
+    ('4_Alerts', page_alerts),
+    ('5_Real_planning', lambda timer, dict_sel: page_planning(timer, dict_sel, 'clean_real_mp')),
+    ('6_Ideal_planning', lambda timer, dict_sel: page_planning(timer, dict_sel, 'clean_ideal_mp')),
+    ('7_Procurement_plan', page_procurement),
+    ('8_Projects', page_projects),
+    ('9_All_MP_data', page_all_mp_data),
+    ('10_Portfolio', page_portfolio),
+    ('11_What_if_policy', page_whatif),
+    ('12_Purchase_simulator', page_simulator),
+    ('13_Stockout_risk', page_risk)
+    ]
+
+#%% Runs
+
+def reset(bool_stores):
+    # Empties the streamlit caches, and the snapshot and export stores on a cold run
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    if bool_stores:
+        for str_dir in [SNAPSHOT_DIR, EXPORT_DIR]:
+            shutil.rmtree(str_dir, ignore_errors=True)
+
+def selection():
+    # Latest version, the one before for comparisons and a SKU in the middle of the list
+    df_versions = get_versions_mp('clean_real_mp')
+    df_skus = load_mp_skus('clean_real_mp', [df_versions['version'].iloc[0]])
+    return {'version': df_versions['version'].iloc[0],
+            'version_old': df_versions['version'].iloc[1] if len(df_versions) > 1 else None,
+            'sku': df_skus['sku'].iloc[len(df_skus)//2]}
+
+def run(int_repeat=3):
+    timer = StageTimer()
+    dict_sel = selection()
+    for _ in range(int_repeat):
+        # cold: nothing cached, snapshot: only the on-disk stores, warm: streamlit caches
+        for str_mode in ['cold', 'snapshot', 'warm']:
+            if str_mode != 'warm':
+                reset(str_mode == 'cold')
+            timer.mode = str_mode
+            for str_page, bench in PAGES:
+                timer.page = str_page
+                bench(timer, dict_sel)
+    df = pd.DataFrame(timer.rows)
+    df_summary = df.groupby(['page', 'stage', 'mode'], sort=False).agg(
+        seconds=('seconds', 'median'), rows=('rows', 'max'), mb=('bytes', lambda x: x.max()/1024**2))
+    df_summary = df_summary['seconds'].unstack('mode').join(df_summary.groupby(['page', 'stage'], sort=False)[['rows', 'mb']].max())
+    return df_summary.round(4)
+
+#%% Main
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the load and transform stages of each page')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help='csv file to store the results')
+    parser.add_argument('--baseline', help='csv file of a previous run to compare with')
+    args = parser.parse_args()
+
+    df = run(args.repeat)
+    if args.baseline:
+        # stages missing from the baseline have no ratio
+        df_baseline = pd.read_csv(args.baseline, index_col=['page', 'stage']).reindex(df.index)
+        for str_mode in ['cold', 'snapshot', 'warm']:
+            df[f'{str_mode}_ratio'] = (df[str_mode]/df_baseline[str_mode]).round(2)
+        # slower by more than 50% and by at least 50 ms on a cold run
+        npa_slower = (df['cold_ratio'] > 1.5) & (df['cold'] - df_baseline['cold'] > 0.05)
+        df['regression'] = np.where(npa_slower, 'yes', '')
+
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+        print(df)
+    if args.out:
+        df.to_csv(args.out)
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# Synthetic MP, material master and project tables for a local stand-in database
+#
+# usage: python -m benchmarks.generate_mp [--skus 10000] [--months 60] [--versions 2] [--url URL]
+#
+# The loaders use Postgres SQL (ANY, DISTINCT ON, LATERAL, FILTER), so the stand-in is a
+# Postgres database, given with --url or MP_BENCH_DB_URL. Existing tables are replaced.
+
+#%% Importing packages
+
+import argparse
+import csv
+import io
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from utils.catalog import register_version
+from utils.loaders import MP_TABLES
+from utils.schema import COMPANIES
+
+#%% Constants
+
+# preset scales, in SKUs
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+# SKUs generated and written per batch
+CHUNK_SKUS = 2000
+
+FAMILIES = ['transformadores', 'conductores', 'medidores', 'herrajes', 'aisladores',
+            'postes', 'protecciones', 'luminarias', 'cables', 'seccionadores']
+
+# service level z of the ss columns, per MP table
+dict_z = {'clean_real_mp': 1.65, 'clean_ideal_mp': 2.05}
+
+#%% Helpers
+
+def copy_rows(table, conn, keys, data_iter):
+    # pandas to_sql method writing through COPY, much faster than INSERT on large frames
+    dbapi_conn = conn.connection
+    with dbapi_conn.cursor() as cur:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(data_iter)
+        buffer.seek(0)
+        str_columns = ', '.join('"' + key.replace('"', '""') + '"' for key in keys)
+        cur.copy_expert(f'COPY "{table.name}" ({str_columns}) FROM STDIN WITH CSV', buffer)
+
+def year_months(int_months, str_start='2025-08'):
+    return list(pd.period_range(str_start, periods=int_months, freq='M').astype(str))
+
+def mp_versions(int_versions, str_last='2025-31'):
+    # weekly versions 'YYYY-WW', oldest first
+    dt_last = date.fromisocalendar(*(int(elem) for elem in str_last.split('-')), 1)
+    ls_versions = []
+    for i in reversed(range(int_versions)):
+        int_year, int_week, _ = (dt_last - timedelta(weeks=i)).isocalendar()
+        ls_versions.append(f'{int_year}-{int_week:02d}')
+    return ls_versions
+
+#%% SKU attributes
+
+def sku_attributes(int_skus, seed=0):
+    # Stable per-SKU attributes shared by every table and version
+    rng = np.random.default_rng(seed)
+    npa_sku = np.array([str(100000 + i) for i in range(int_skus)])
+    df = pd.DataFrame({
+        'sku': npa_sku,
+        'sku_description': np.char.add('material ', npa_sku),
+        'sku_family': rng.choice(FAMILIES, int_skus),
+        'lead_time_e_months': rng.gamma(4, 0.8, int_skus).round(2) + 0.5,
+        'lead_time_type': rng.choice(['historic', 'default'], int_skus, p=[0.7, 0.3]),
+        'unit_price': np.exp(rng.normal(5, 1.5, int_skus)).round(2)
+        })
+    df['lead_time_std_months'] = (df['lead_time_e_months']*rng.uniform(0.05, 0.4, int_skus)).round(2)
+    for str_company in COMPANIES:
+        # about half of the SKUs are not used by a company
+        npa_used = rng.random(int_skus) < 0.5
+        df[f'demand_{str_company}'] = np.where(npa_used, rng.gamma(1.2, 15, int_skus), 0.0)
+        df[f'cv_{str_company}'] = rng.uniform(0.2, 1.2, int_skus)
+        df[f'min_stock_{str_company}'] = np.where(rng.random(int_skus) < 0.2,
+                                                  rng.integers(1, 20, int_skus), 0).astype(float)
+    return df
+
+#%% MP tables
+
+def generate_mp_chunk(df_attrs, ls_year_months, str_version, flt_z, rng):
+    # One version of an MP table for a block of SKUs, rolled forward month by month
+    int_skus, int_months = len(df_attrs), len(ls_year_months)
+    dict_data = {
+        'version': str_version,
+        'sku': np.repeat(df_attrs['sku'].values, int_months),
+        'sku_description': np.repeat(df_attrs['sku_description'].values, int_months),
+        'sku_family': np.repeat(df_attrs['sku_family'].values, int_months),
+        'year': np.tile([elem[:4] for elem in ls_year_months], int_skus),
+        'year_month': np.tile(ls_year_months, int_skus),
+        'lead_time_e_months': np.repeat(df_attrs['lead_time_e_months'].values, int_months),
+        'lead_time_std_months': np.repeat(df_attrs['lead_time_std_months'].values, int_months),
+        'lead_time_type': np.repeat(df_attrs['lead_time_type'].values, int_months)
+        }
+
+    npa_lt = df_attrs['lead_time_e_months'].values[:, None]
+    npa_lt_std = df_attrs['lead_time_std_months'].values[:, None]
+    npa_price = df_attrs['unit_price'].values[:, None]
+    npa_month = np.arange(int_months)[None, :]
+
+    for str_company in COMPANIES:
+        npa_mean = df_attrs[f'demand_{str_company}'].values[:, None]
+        npa_std = npa_mean*df_attrs[f'cv_{str_company}'].values[:, None]
+        npa_recurrent = np.maximum(rng.normal(npa_mean, npa_std, (int_skus, int_months)), 0).round()
+        npa_project = np.where(rng.random((int_skus, int_months)) < 0.03,
+                               rng.gamma(2, 20, (int_skus, int_months)), 0).round()
+        npa_sales = np.where(rng.random((int_skus, int_months)) < 0.01,
+                             rng.gamma(1, 5, (int_skus, int_months)), 0).round()
+        npa_demand = npa_recurrent + npa_project + npa_sales
+        npa_min = np.repeat(df_attrs[f'min_stock_{str_company}'].values[:, None], int_months, axis=1)
+
+        # ss = z*sqrt(LT*sd^2 + d^2*sd_LT^2), rp = d*LT + ss
+        npa_ss = (flt_z*np.sqrt(npa_lt*npa_std**2 + npa_mean**2*npa_lt_std**2)).round()
+        npa_ss = np.repeat(npa_ss, int_months, axis=1)
+        npa_rp = np.repeat((npa_mean*npa_lt).round(), int_months, axis=1) + npa_ss
+
+        # roll forward, ordering up to rp + one month of demand when below the reorder point
+        npa_initial = np.zeros((int_skus, int_months))
+        npa_purchase = np.zeros((int_skus, int_months))
+        npa_projected = np.zeros((int_skus, int_months))
+        npa_stock = rng.uniform(0, 2, int_skus)*npa_rp[:, 0] + npa_min[:, 0]
+        for j in range(int_months):
+            npa_initial[:, j] = npa_stock
+            npa_projected[:, j] = npa_stock - npa_demand[:, j]
+            npa_floor = np.maximum(npa_rp[:, j], npa_min[:, j])
+            npa_purchase[:, j] = np.where(npa_projected[:, j] < npa_floor,
+                                          npa_floor + npa_mean[:, 0] - npa_projected[:, j], 0).round()
+            npa_stock = np.maximum(npa_projected[:, j] + npa_purchase[:, j], 0)
+        npa_final = npa_initial + npa_purchase - npa_demand
+
+        # alerts only inside the lead time, where a purchase can no longer arrive in time
+        npa_in_lt = npa_month < npa_lt
+        npa_type = np.select(
+            [npa_in_lt & (npa_projected < 0),
+             npa_in_lt & (npa_projected < npa_ss),
+             npa_in_lt & (npa_purchase > 0)],
+            ['stock out', 'near miss', 'emergency'],
+            'no emergency')
+
+        npa_ra = (npa_initial*rng.uniform(0, 0.1, (int_skus, 1))).round()
+        dict_data.update({
+            f'inventory_initial_new_{str_company}': (npa_initial - npa_ra).ravel(),
+            f'inventory_initial_ra_{str_company}': npa_ra.ravel(),
+            f'inventory_initial_new&ra_{str_company}': npa_initial.ravel(),
+            f'demand_recurrent_consumption_{str_company}': npa_recurrent.ravel(),
+            f'demand_project_consumption_{str_company}': npa_project.ravel(),
+            f'demand_sales_{str_company}': npa_sales.ravel(),
+            f'demand_min_stock_{str_company}': npa_min.ravel(),
+            f'ss_inventory_{str_company}': npa_ss.ravel(),
+            f'rp_inventory_{str_company}': npa_rp.ravel(),
+            f'inventory_purchase_{str_company}': npa_purchase.ravel(),
+            f'purchase_type_{str_company}': npa_type.ravel(),
+            f'inventory_final_new&ra_{str_company}': npa_final.ravel(),
+            f'inventory_initial_new&ra_{str_company}_valuation': (npa_initial*npa_price).ravel(),
+            f'inventory_purchase_{str_company}_valuation': (npa_purchase*npa_price).ravel()
+            })
+    return pd.DataFrame(dict_data)
+
+def write_mp_table(engine, table, df_attrs, ls_versions, ls_year_months, seed=0):
+    rng = np.random.default_rng(seed)
+    str_if_exists = 'replace'
+    int_rows = 0
+    for str_version in ls_versions:
+        for i in range(0, len(df_attrs), CHUNK_SKUS):
+            df = generate_mp_chunk(df_attrs.iloc[i:i + CHUNK_SKUS], ls_year_months, str_version,
+                                   dict_z[table], rng)
+            df.to_sql(table, engine, if_exists=str_if_exists, index=False, method=copy_rows)
+            str_if_exists = 'append'
+            int_rows += len(df)
+    with engine.begin() as connection:
+        connection.execute(text(f'CREATE INDEX ON {table} (version, sku)'))
+        connection.execute(text(f'ANALYZE {table}'))
+    return int_rows
+
+#%% Master data and projects
+
+def generate_master_data(df_attrs, seed=0):
+    # One row per (sku, company) where the company uses the SKU
+    rng = np.random.default_rng(seed)
+    ls_frames = []
+    for str_company in COMPANIES:
+        df = df_attrs.loc[df_attrs[f'demand_{str_company}'] > 0, ['sku', 'sku_description', 'sku_family']]
+        int_rows = len(df)
+        ls_frames.append(pd.DataFrame({
+            'sap_codigo': df['sku'].values,
+            'sociedad': str_company.upper(),
+            'sap_descripcion': df['sku_description'].values,
+            'familia_01': df['sku_family'].values,
+            'mrp': rng.choice(['si', 'no'], int_rows, p=[0.6, 0.4]),
+            'mto': rng.choice(['si', 'no'], int_rows, p=[0.15, 0.85]),
+            'min_stock': rng.choice(['si', 'no'], int_rows, p=[0.2, 0.8]),
+            'obsoleto': rng.choice(['si', 'no'], int_rows, p=[0.05, 0.95]),
+            'overall_classification': rng.choice(['A', 'B', 'C'], int_rows, p=[0.2, 0.3, 0.5])
+            }))
+    return pd.concat(ls_frames, ignore_index=True)
+
+def generate_projects(df_attrs, ls_year_months, int_projects, seed=0):
+    # Project plan (one row per sku and month) and the consumption booked against it
+    rng = np.random.default_rng(seed)
+    ls_plan = []
+    for i in range(int_projects):
+        int_versions = rng.integers(1, 4)
+        npa_skus = rng.choice(df_attrs['sku'].values, rng.integers(5, 60))
+        npa_months = rng.choice(ls_year_months, len(npa_skus))
+        npa_qty = rng.gamma(2, 10, len(npa_skus)).round()
+        for int_version in range(1, int_versions + 1):
+            ls_plan.append(pd.DataFrame({
+                'project_version': f'P{i:04d}_v{int_version}',
+                'project_description': f'proyecto {i:04d}',
+                'version_int': int_version,
+                'pep': f'PEP-{i:04d}',
+                'company': rng.choice(COMPANIES),
+                'sku': npa_skus,
+                'year_month': npa_months,
+                'qty': npa_qty*rng.uniform(0.8, 1.2)
+                }))
+    df_projects = pd.concat(ls_plan, ignore_index=True)
+
+    # consumption is negative and covers part of the planned rows
+    df_consumption = df_projects.sample(frac=0.4, random_state=seed)
+    df_consumption = pd.DataFrame({
+        'project_version': df_consumption['project_version'].values,
+        'sku': df_consumption['sku'].values,
+        'sku_description': np.char.add('material ', df_consumption['sku'].values.astype(str)),
+        'val_type': rng.choice(['NUEVO', 'RA'], len(df_consumption), p=[0.9, 0.1]),
+        'center': rng.choice(['C100', 'C200'], len(df_consumption)),
+        'warehouse': rng.choice(['W01', 'W02', 'W03'], len(df_consumption)),
+        'year': df_consumption['year_month'].str[:4].values,
+        'year_month': df_consumption['year_month'].values,
+        'qty': -(df_consumption['qty']*rng.uniform(0.5, 1.1, len(df_consumption))).round().values,
+        'material_document': [f'MD{i:08d}' for i in range(len(df_consumption))],
+        'pep_project': df_consumption['pep'].values
+        })
+    return df_projects, df_consumption
+
+#%% Main
+
+def generate(engine, int_skus, int_months=60, int_versions=2, int_projects=None, seed=0):
+    ls_year_months = year_months(int_months)
+    ls_versions = mp_versions(int_versions)
+    df_attrs = sku_attributes(int_skus, seed)
+
+    for i, table in enumerate(MP_TABLES):
+        t0 = time.perf_counter()
+        int_rows = write_mp_table(engine, table, df_attrs, ls_versions, ls_year_months, seed + i)
+        for str_version in ls_versions:
+            register_version(table, str_version, engine)
+        print(f'{table}: {int_rows} rows in {time.perf_counter() - t0:.1f} s')
+
+    df_projects, df_consumption = generate_projects(df_attrs, ls_year_months,
+                                                    int_projects or max(int_skus//50, 20), seed)
+    for table, df in [('raw_master_data', generate_master_data(df_attrs, seed)),
+                      ('clean_company_projects', df_projects),
+                      ('clean_company_projects_consumption', df_consumption)]:
+        df.to_sql(table, engine, if_exists='replace', index=False, method=copy_rows)
+        print(f'{table}: {len(df)} rows')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic MP tables in a Postgres stand-in')
+    parser.add_argument('--skus', default='1k', help='number of SKUs or a preset: 1k, 10k, 100k')
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--versions', type=int, default=2)
+    parser.add_argument('--projects', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', default=os.environ.get('MP_BENCH_DB_URL'))
+    args = parser.parse_args()
+    if not args.url:
+        parser.error('a stand-in database is required: --url or MP_BENCH_DB_URL')
+
+    int_skus = SCALES[args.skus] if args.skus in SCALES else int(args.skus)
+    generate(create_engine(args.url), int_skus, args.months, args.versions, args.projects, args.seed)
@@ -0,0 +1,93 @@
+#%% Importing packages
+
+import streamlit as st
+from datetime import datetime
+
+from utils.catalog import get_versions_mp
+from utils.charts import build_mrp_figure
+from utils.exports import download_frame
+from utils.loaders import load_mp_skus, load_portfolio_sums
+from utils.prefetch import prefetch
+from utils.schema import COMPANIES
+
+#%% Version selection
+
+st.title('MP version')
+
+data_load_state = st.text('Loading data...')
+df_versions = get_versions_mp('clean_real_mp')
+data_load_state.text("Done! (using st.cache_data)")
+
+option = st.selectbox(
+    "Select the year-week MP version you are interested in:",
+    list(df_versions['version'])
+    )
+st.write("You selected:", option)
+
+# the data users usually open next is loaded in the background
+prefetch('clean_real_mp', option)
+
+#%% Family and company selection
+
+st.title('Portfolio Material Planning')
+st.write('Sums over all SKUs of a family, or of the whole version, per month')
+
+df_skus = load_mp_skus('clean_real_mp', [option])
+
+option_family= st.selectbox(
+    "Select the SKU family or all:",
+    ['all']+sorted(df_skus['sku_family'].dropna().unique()))
+
+option_company= st.selectbox(
+    "Select the company or all:",
+    ['all']+COMPANIES)
+
+#%% Loading data
+
+# aggregated by the database, cached per (version, family, company)
+data_load_state = st.text('Aggregating MP data...')
+df_portfolio= load_portfolio_sums('clean_real_mp',
+                                  option,
+                                  None if option_family == 'all' else option_family,
+                                  None if option_company == 'all' else option_company)
+df_portfolio= df_portfolio.set_index('year_month')
+data_load_state.text("Done! (using st.cache_data)")
+
+#%% website
+
+st.header(f'Graphical Material Planning for {option_family} ({option_company.upper()})')
+st.write(f'{df_portfolio["n_skus"].max() if len(df_portfolio) else 0} SKUs, quantities added over SKUs')
+st.plotly_chart(build_mrp_figure(df_portfolio, f'MRP for {option_family}'), use_container_width=True)
+
+st.header('Inventory and purchase valuation (MGTQ)')
+df_valuation= (df_portfolio[['inventory_initial_new&ra_valuation', 'inventory_purchase_valuation']]/1000000).round(3)
+st.line_chart(df_valuation, y_label='MGTQ', x_label='year_month')
+
+st.header('Tabular Material Planning')
+st.dataframe(df_portfolio.T)
+
+#date
+dt_now= datetime.now()
+dt_now= dt_now.strftime('%Y%m%d')
+
+download_frame(
+    "📥 Download portfolio material planning",
+    df_portfolio,
+    'portfolio',
+    ('clean_real_mp', option, option_family, option_company),
+    f'{dt_now}_portfolio_{option_family}_{option_company}',
+    key='download-csv-00',
+    index=True
+)
+
+#%% Families
+
+st.header('Purchase valuation per SKU family (MGTQ)')
+
+df_families= load_portfolio_sums('clean_real_mp',
+                                 option,
+                                 company=None if option_company == 'all' else option_company,
+                                 by='sku_family').set_index('sku_family')
+df_families= df_families[['n_skus', 'inventory_purchase_valuation']]
+df_families['inventory_purchase_valuation']= (df_families['inventory_purchase_valuation']/1000000).round(3)
+st.dataframe(df_families.sort_values('inventory_purchase_valuation', ascending=False))
@@ -0,0 +1,91 @@
+#%% Importing packages
+
+import streamlit as st
+from datetime import datetime
+import time
+
+from utils.catalog import get_versions_mp
+from utils.exports import download_frame
+from utils.policy import BASE_SERVICE_LEVEL, compute_policy, load_policy_inputs, service_z, summarize_policy
+from utils.prefetch import prefetch
+from utils.tables import render_paged_frame
+
+#%% Version selection
+
+st.title('MP version')
+
+data_load_state = st.text('Loading data...')
+df_versions = get_versions_mp('clean_real_mp')
+data_load_state.text("Done! (using st.cache_data)")
+
+option = st.selectbox(
+    "Select the year-week MP version you are interested in:",
+    list(df_versions['version'])
+    )
+st.write("You selected:", option)
+
+# the data users usually open next is loaded in the background
+prefetch('clean_real_mp', option)
+
+#%% Assumptions
+
+st.title('What-if safety stock and reorder point')
+st.write('ss = z·√(LT·σd² + d²·σLT²) and rp = d·LT + ss are recomputed for every SKU, company and month. '
+         'The demand deviation σd is backed out of the stored ss at its service level.')
+
+col_base, col_new = st.columns(2)
+flt_base_level= col_base.slider('Service level of the stored ss', 0.90, 0.995, BASE_SERVICE_LEVEL, 0.005, format='%.3f')
+flt_level= col_new.slider('What-if service level', 0.90, 0.995, BASE_SERVICE_LEVEL, 0.005, format='%.3f')
+
+col_lt, col_lt_std = st.columns(2)
+flt_lt_factor= col_lt.slider('Lead time factor (x expected lead time)', 0.5, 2.0, 1.0, 0.05)
+flt_lt_std_factor= col_lt_std.slider('Lead time variability factor (x lead time std)', 0.0, 3.0, 1.0, 0.05)
+
+st.write(f'z: {service_z(flt_base_level):.3f} -> {service_z(flt_level):.3f}')
+
+#%% Engine
+
+data_load_state = st.text('Loading MP version...')
+dict_inputs= load_policy_inputs('clean_real_mp', option)
+data_load_state.text("Done! (using st.cache_resource)")
+
+# the whole version in one broadcast, recomputed on every change of the assumptions
+t0= time.perf_counter()
+dict_policy= compute_policy(dict_inputs, flt_level, flt_base_level, flt_lt_factor, flt_lt_std_factor)
+df_months, df_skus= summarize_policy(dict_inputs, dict_policy)
+st.caption(f'{len(dict_inputs["skus"])} SKUs x {len(dict_inputs["months"])} months recomputed in {time.perf_counter() - t0:.3f} s')
+
+#%% website
+
+st.header('Safety stock valuation per month (MGTQ)')
+
+df_months= (df_months/1000000).round(3)
+st.line_chart(df_months[['ss_valuation', 'ss_valuation_whatif']], y_label='MGTQ', x_label='year_month')
+
+col_first, col_mean = st.columns(2)
+col_first.metric('Safety stock valuation, first month (MGTQ)',
+                 f"{df_months['ss_valuation_whatif'].iloc[0]:,.3f}",
+                 f"{df_months['ss_valuation_whatif'].iloc[0] - df_months['ss_valuation'].iloc[0]:+,.3f}")
+col_mean.metric('Safety stock valuation, horizon average (MGTQ)',
+                f"{df_months['ss_valuation_whatif'].mean():,.3f}",
+                f"{(df_months['ss_valuation_whatif'] - df_months['ss_valuation']).mean():+,.3f}")
+
+st.dataframe(df_months.T)
+
+st.header('Safety stock and reorder point per SKU (horizon average, all companies)')
+df_skus= df_skus.round(2)
+render_paged_frame(df_skus, 'whatif-skus')
+
+#date
+dt_now= datetime.now()
+dt_now= dt_now.strftime('%Y%m%d')
+
+download_frame(
+    "📥 Download what-if ss and rp per SKU",
+    df_skus,
+    'whatif_skus',
+    ('clean_real_mp', option, flt_base_level, flt_level, flt_lt_factor, flt_lt_std_factor),
+    f'{dt_now}_whatif_{option}',
+    key='download-csv-00',
+    index=True
+)
@@ -0,0 +1,128 @@
+#%% Importing packages
+
+import streamlit as st
+from datetime import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.catalog import get_versions_mp
+from utils.charts import build_mrp_figure
+from utils.exports import download_frame
+from utils.prefetch import prefetch
+from utils.simulation import (defer_purchases, load_base_simulation, load_simulation_inputs, scale_purchases,
+                              simulate, sku_path, summarize_simulation)
+from utils.tables import render_paged_frame
+
+#%% Version selection
+
+st.title('MP version')
+
+data_load_state = st.text('Loading data...')
+df_versions = get_versions_mp('clean_real_mp')
+data_load_state.text("Done! (using st.cache_data)")
+
+option = st.selectbox(
+    "Select the year-week MP version you are interested in:",
+    list(df_versions['version'])
+    )
+st.write("You selected:", option)
+
+# the data users usually open next is loaded in the background
+prefetch('clean_real_mp', option)
+
+data_load_state = st.text('Loading MP version...')
+dict_inputs= load_simulation_inputs('clean_real_mp', option)
+dict_base= load_base_simulation('clean_real_mp', option)
+data_load_state.text("Done! (using st.cache_resource)")
+
+#%% Purchase plan edits
+
+st.title('Purchase plan simulator')
+st.write('Inventory is rolled forward for every SKU, company and month with the edited purchases: '
+         'final = initial + purchases - (recurrent + project + sales demand), '
+         'the next month starts from the final inventory or zero.')
+
+option_family= st.selectbox(
+    "Select the SKU family to edit or all:",
+    ['all']+sorted(pd.unique(pd.Series(dict_inputs['sku_family']).dropna())))
+npa_skus_mask= None if option_family == 'all' else dict_inputs['sku_family'] == option_family
+
+col_defer, col_from, col_factor = st.columns(3)
+int_defer= col_defer.number_input('Defer purchases by (months)', min_value=0, max_value=24, value=0, step=1)
+str_from_month= col_from.selectbox('Starting from', list(dict_inputs['months']))
+flt_factor= col_factor.slider('Purchase quantity factor', 0.0, 2.0, 1.0, 0.05)
+
+npa_purchase= defer_purchases(dict_inputs['purchase'], int_defer, str_from_month, dict_inputs['months'], npa_skus_mask)
+if flt_factor != 1.0:
+    npa_purchase= scale_purchases(npa_purchase, flt_factor, npa_skus_mask)
+
+# purchase plan of a single SKU, edited cell by cell
+option_sku= st.selectbox(
+    "Edit the purchase plan of a SKU (optional):",
+    [""]+list(dict_inputs['skus']))
+
+if option_sku:
+    int_sku= int(np.flatnonzero(dict_inputs['skus'] == option_sku)[0])
+    df_plan= pd.DataFrame(npa_purchase[int_sku],
+                          index=pd.Index(dict_inputs['months'], name='year_month'),
+                          columns=dict_inputs['companies'])
+    df_plan= st.data_editor(df_plan, key=f'plan-{option}-{option_sku}', use_container_width=True)
+    npa_purchase[int_sku]= df_plan.to_numpy(dtype=npa_purchase.dtype)
+
+#%% Simulation
+
+option_company= st.selectbox(
+    "Select the company or all:",
+    ['all']+dict_inputs['companies'])
+ls_companies= None if option_company == 'all' else [option_company]
+
+t0= time.perf_counter()
+dict_sim= simulate(dict_inputs, npa_purchase)
+df_months, df_skus= summarize_simulation(dict_inputs, dict_base, dict_sim, ls_companies)
+st.caption(f'{len(dict_inputs["skus"])} SKUs x {len(dict_inputs["months"])} months simulated in {time.perf_counter() - t0:.3f} s')
+
+#%% website
+
+st.header('SKUs ending the month below safety stock')
+st.line_chart(df_months[['below_ss_base', 'below_ss_whatif']], y_label='SKUs', x_label='year_month')
+
+st.header('SKUs in stockout')
+st.line_chart(df_months[['stockout_base', 'stockout_whatif']], y_label='SKUs', x_label='year_month')
+
+st.header('Inventory and purchase valuation (MGTQ)')
+ls_valuation= ['inventory_valuation_base', 'inventory_valuation_whatif', 'purchase_valuation_base', 'purchase_valuation_whatif']
+df_months[ls_valuation]= (df_months[ls_valuation]/1000000).round(3)
+st.line_chart(df_months[ls_valuation[:2]], y_label='MGTQ', x_label='year_month')
+st.dataframe(df_months.T)
+
+# SKUs that are flagged more often with the edited plan
+st.header('SKUs flagged more often than with the stored plan')
+npa_worse= np.zeros(len(df_skus), dtype=bool)
+for str_flag in ['stockout', 'below_ss', 'below_rp', 'below_min']:
+    npa_worse |= (df_skus[f'{str_flag}_months_whatif'] > df_skus[f'{str_flag}_months_base']).to_numpy()
+df_worse= df_skus[npa_worse]
+st.write(f'{len(df_worse)} SKUs')
+render_paged_frame(df_worse, 'simulator-skus')
+
+#date
+dt_now= datetime.now()
+dt_now= dt_now.strftime('%Y%m%d')
+
+download_frame(
+    "📥 Download flagged SKUs",
+    df_worse,
+    'simulator_skus',
+    ('clean_real_mp', option, option_family, int_defer, str_from_month, flt_factor, option_company,
+     # cell edits of the SKU plan are part of the key
+     option_sku, npa_purchase[int_sku].tobytes() if option_sku else b''),
+    f'{dt_now}_simulation_{option}',
+    key='download-csv-00',
+    index=True
+)
+
+if option_sku:
+    st.header(f'Simulated Material Planning for {option_sku}')
+    df_path= sku_path(dict_inputs, dict_sim, int_sku, ls_companies)
+    st.plotly_chart(build_mrp_figure(df_path, f'MRP for {option_sku}'), use_container_width=True)
@@ -0,0 +1,126 @@
+#%% Importing packages
+
+import streamlit as st
+from datetime import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.catalog import get_versions_mp
+from utils.exports import download_frame
+from utils.montecarlo import RISK_PATHS, RISK_SEED, RISK_THRESHOLD, load_stockout_risk, summarize_risk
+from utils.policy import BASE_SERVICE_LEVEL
+from utils.prefetch import prefetch
+from utils.simulation import load_base_simulation, load_simulation_inputs
+from utils.tables import render_paged_frame
+
+#%% Version selection
+
+st.title('MP version')
+
+data_load_state = st.text('Loading data...')
+df_versions = get_versions_mp('clean_real_mp')
+data_load_state.text("Done! (using st.cache_data)")
+
+option = st.selectbox(
+    "Select the year-week MP version you are interested in:",
+    list(df_versions['version'])
+    )
+st.write("You selected:", option)
+
+# the data users usually open next is loaded in the background
+prefetch('clean_real_mp', option)
+
+#%% Assumptions
+
+st.title('Stockout risk')
+st.write('The recurrent demand of every SKU, company and month is sampled as normal around the stored consumption, '
+         'with σd backed out of the stored ss, and each purchase arrives off plan by a normal lead time deviation σLT. '
+         'Every path is rolled forward with the stored purchases, the stockout probability is the share of paths '
+         'ending the month below zero.')
+
+col_paths, col_seed, col_base = st.columns(3)
+int_paths= col_paths.selectbox('Paths per SKU', [100, 500, RISK_PATHS, 2000], index=2)
+int_seed= int(col_seed.number_input('Seed', min_value=0, value=RISK_SEED, step=1))
+flt_base_level= col_base.slider('Service level of the stored ss', 0.90, 0.995, BASE_SERVICE_LEVEL, 0.005, format='%.3f')
+
+# sampling takes minutes on a large version: it runs on demand and is then shared by all sessions
+tpl_run= ('clean_real_mp', option, int_paths, int_seed, flt_base_level)
+if st.button('Run simulation'):
+    st.session_state.setdefault('risk-runs', set()).add(tpl_run)
+if tpl_run not in st.session_state.get('risk-runs', set()):
+    st.info('Select the assumptions and run the simulation.')
+    st.stop()
+
+#%% Engine
+
+data_load_state = st.text('Loading MP version...')
+dict_inputs= load_simulation_inputs('clean_real_mp', option)
+dict_base= load_base_simulation('clean_real_mp', option)
+data_load_state.text("Done! (using st.cache_resource)")
+
+t0= time.perf_counter()
+with st.spinner(f'Sampling {len(dict_inputs["skus"])} SKUs x {int_paths} paths...'):
+    dict_result= load_stockout_risk(*tpl_run)
+st.caption(f'{len(dict_inputs["skus"])} SKUs x {len(dict_inputs["months"])} months x {int_paths} paths '
+           f'in {time.perf_counter() - t0:.1f} s (using st.cache_resource)')
+
+option_company= st.selectbox(
+    "Select the company or any:",
+    ['any']+dict_inputs['companies'])
+str_company= None if option_company == 'any' else option_company
+
+flt_threshold= st.slider('Stockout probability from which a month is at risk', 0.01, 0.5, RISK_THRESHOLD, 0.01)
+df_months, df_skus= summarize_risk(dict_inputs, dict_result, str_company, flt_threshold)
+
+#%% website
+
+st.header('Expected SKUs in stockout per month')
+# stockouts of the stored plan without any variability, for reference
+npa_base= dict_base['flags']['stockout']
+if str_company is None:
+    df_months['skus_in_stockout_plan']= npa_base.any(axis=2).sum(axis=0)
+else:
+    df_months['skus_in_stockout_plan']= npa_base[:, :, dict_inputs['companies'].index(str_company)].sum(axis=0)
+st.line_chart(df_months[['expected_skus_in_stockout', 'skus_in_stockout_plan']], y_label='SKUs', x_label='year_month')
+
+st.header(f'SKUs at risk per month (probability ≥ {flt_threshold:.2f})')
+st.bar_chart(df_months['skus_at_risk'], y_label='SKUs', x_label='year_month')
+st.dataframe(df_months.T)
+
+st.header('SKUs ranked by stockout probability')
+df_skus= df_skus[df_skus['months_at_risk'] > 0].sort_values(['max_stockout_probability', 'months_at_risk'],
+                                                            ascending=False).round(3)
+st.write(f'{len(df_skus)} SKUs at risk')
+render_paged_frame(df_skus, 'risk-skus')
+
+#date
+dt_now= datetime.now()
+dt_now= dt_now.strftime('%Y%m%d')
+
+download_frame(
+    "📥 Download SKUs at risk",
+    df_skus,
+    'risk_skus',
+    tpl_run + (option_company, flt_threshold),
+    f'{dt_now}_stockout_risk_{option}',
+    key='download-csv-00',
+    index=True
+)
+
+#%% SKU detail
+
+option_sku= st.selectbox(
+    "Select a SKU to see its stockout probability per company:",
+    [""]+list(df_skus.index))
+
+if option_sku:
+    int_sku= int(np.flatnonzero(dict_inputs['skus'] == option_sku)[0])
+    df_sku= pd.DataFrame(dict_result['prob'][int_sku],
+                         index=pd.Index(dict_inputs['months'], name='year_month'),
+                         columns=dict_inputs['companies'])
+    df_sku['any']= dict_result['prob_any'][int_sku]
+    st.header(f'Stockout probability of {option_sku}')
+    st.line_chart(df_sku, y_label='probability', x_label='year_month')
+    st.dataframe(df_sku.round(3).T)
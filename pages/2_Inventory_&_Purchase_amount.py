@@ -4,41 +4,19 @@
 
 import streamlit as st
 from datetime import datetime
-import io
 
 import pandas as pd
 
-#%% Functions
-
-@st.cache_data
-def load_versions_mp():
-    # Initialize connection.
-    conn = st.connection("postgresql", type="sql")
-    # Perform query
-    df = conn.query('SELECT DISTINCT(version) AS version FROM clean_real_mp ORDER BY version DESC', ttl="10m")
-    return df
-
-@st.cache_data
-def load_data_mp(version_list):
-    # Initialize connection.
-    conn = st.connection("postgresql", type="sql")
-    # Build query with placeholders
-    query = "SELECT * FROM clean_real_mp WHERE version = ANY(:versions)"
-    # Run query safely
-    df = conn.query(query, params={"versions": version_list}, ttl="10m")
-    return df
-
-@st.cache_data
-def convert_df(df):
-    # Convert DataFrame to CSV in memory with UTF-8 BOM encoding
-    output = io.BytesIO()
-    df.to_csv(output, index=True, encoding='utf-8-sig')  # <-- BOM added here
-    return output.getvalue()
+from utils.catalog import get_versions_mp
+from utils.exports import download_frame
+from utils.loaders import load_company_schema, load_company_sums
+from utils.prefetch import prefetch
+from utils.schema import company_columns, company_of
 
 #%% Downloading dataframe
 
 data_load_state = st.text('Loading data...')
-df_versions = load_versions_mp()
+df_versions = get_versions_mp('clean_real_mp')
 data_load_state.text("Done! (using st.cache_data)")
 
 #%% Version selection
@@ -51,29 +29,18 @@ option = st.selectbox(
     )
 st.write("You selected:", option)
 
-# loading dataset
-data = load_data_mp([option])
+# the data users usually open next is loaded in the background
+prefetch('clean_real_mp', option)
 
 #%% Inventory simulation
 
-cols = [
-        'inventory_initial_new&ra_eegsa_valuation',
-        'inventory_initial_new&ra_trelec_valuation',
-        'inventory_initial_new&ra_amesa_valuation',
-        'inventory_initial_new&ra_energica_valuation',
-        'year_month']
+# per-company valuation columns
+schema = load_company_schema('clean_real_mp')
+cols_old_companies = company_columns(schema, 'inventory_initial_new&ra_valuation')
+cols_p = company_columns(schema, 'inventory_purchase_valuation')
 
-cols_old_companies = cols[0:4]
+cols_new_companies = [company_of(elem) for elem in cols_old_companies]
 
-cols_new_companies = [
-    'eegsa',
-    'trelec',
-    'amesa',
-    'energica'
-    ]
-
-df = data[cols]
-     
 cols_options = [
     'all',
     'eegsa',
@@ -83,12 +50,10 @@ cols_options = [
     'energica']
 
 dict_values= dict(zip(cols_old_companies,cols_new_companies))
-df= df.rename(columns= dict_values)
 
-df_pivot= pd.pivot_table(df,
-               index= 'year_month',
-               values= cols_new_companies,
-               aggfunc= 'sum')
+# monthly sums, materialized when the version was registered
+df_pivot= load_company_sums('clean_real_mp', [option], 'inventory_initial_new&ra_valuation', 'year_month')
+df_pivot= df_pivot.set_index('year_month').rename(columns= dict_values)
 
 df_pivot= (df_pivot/1000000).round(3)
 df_pivot['all']=df_pivot.sum(axis= 1)
@@ -117,59 +82,38 @@ st.line_chart(chart_data, y_label='MGTQ', x_label= 'year_month')
 dt_now= datetime.now()
 dt_now= dt_now.strftime('%Y%m%d')
 
-csv_00 = convert_df(df_pivot)
-st.download_button(
-   "📥 Download inventory simulation as (.csv)",
-   csv_00,
-   f'{dt_now}_is.csv',
-   "text/csv",
-   key='download-csv-00'
+download_frame(
+   "📥 Download inventory simulation",
+   df_pivot,
+   'inventory_simulation',
+   ('clean_real_mp', option, tuple(options)),
+   f'{dt_now}_is',
+   key='download-csv-00',
+   index=True
 )
 
 #%% Yearly purchases
 
-# Creating dictionaries
-dict_sku_description= dict(zip(data['sku'], data['sku_description']))
-dict_sku_family= dict(zip(data['sku'], data['sku_family']))
-
-cols_p=  [
-       'inventory_purchase_eegsa_valuation',
-       'inventory_purchase_trelec_valuation',
-       'inventory_purchase_amesa_valuation',
-       'inventory_purchase_energica_valuation',
-       'year_month', 'year'
-       ]
-
-df_p= data[cols_p]
-
-df_year= pd.pivot_table(df_p,
-    index= 'year',
-    values= ['inventory_purchase_eegsa_valuation',
-    'inventory_purchase_trelec_valuation',
-    'inventory_purchase_amesa_valuation',
-    'inventory_purchase_energica_valuation'],
-    aggfunc= 'sum'
-    )
+# yearly sums, materialized when the version was registered
+df_year= load_company_sums('clean_real_mp', [option], 'inventory_purchase_valuation', 'year')
+df_year= df_year.set_index('year')
 
 df_year= (df_year/1000000).round(2)
 df_year["total"] = df_year.sum(axis= 1)
 
-df_year= df_year[['inventory_purchase_eegsa_valuation',
-'inventory_purchase_trelec_valuation',
-'inventory_purchase_amesa_valuation',
-'inventory_purchase_energica_valuation',
-'total']]
+df_year= df_year[cols_p+['total']]
 
 #%% #%% Yearly visualization and download
 
 st.header("Purchase amount per company and year (MGTQ)")
 st.dataframe(df_year)
 
-csv_01 = convert_df(df_year)
-st.download_button(
-    "📥 Download purchase amount per company and year as (.csv)",
-    csv_01,
-    f'{dt_now}_purchaseplan.csv',
-    "text/csv",
-    key='download-csv-01'
+download_frame(
+    "📥 Download purchase amount per company and year",
+    df_year,
+    'purchase_amount',
+    ('clean_real_mp', option),
+    f'{dt_now}_purchaseplan',
+    key='download-csv-01',
+    index=True
 )
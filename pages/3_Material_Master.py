@@ -4,27 +4,12 @@
 
 import streamlit as st
 from datetime import datetime
-import io
 
 import pandas as pd
 import numpy as np
 
-#%% Functions
-
-@st.cache_data
-def load_data_mm():
-    # Initialize connection.
-    conn = st.connection("postgresql", type="sql")
-    # Perform query
-    df = conn.query('SELECT * FROM raw_master_data', ttl="10m")
-    return df
-
-@st.cache_data
-def convert_df(df):
-    # Convert DataFrame to CSV in memory with UTF-8 BOM encoding
-    output = io.BytesIO()
-    df.to_csv(output, index=False, encoding='utf-8-sig')  # <-- BOM added here
-    return output.getvalue()
+from utils.exports import download_frame
+from utils.loaders import load_data_mm
 
 #%% Loading material master
 
@@ -91,22 +76,22 @@ dt_now= datetime.now()
 dt_now= dt_now.strftime('%Y%m%d')
 
 st.header("Material Master Download - ⚠️ does not contain OBSOLETE SKUs")
-csv_00 = convert_df(df_mm_dw)
-st.download_button(
-   "📥 Download EPM GUA Material Master (.csv)",
-   csv_00,
-   f'{dt_now}_material_master_wo.csv',
-   "text/csv",
+download_frame(
+   "📥 Download EPM GUA Material Master",
+   df_mm_dw,
+   'material_master_wo',
+   None,
+   f'{dt_now}_material_master_wo',
    key='download-csv-00'
 )
 
 st.header("Material Master Download - complete")
-csv_01 = convert_df(df_mm_c)
-st.download_button(
-   "📥 Download EPM GUA Material Master (.csv)",
-   csv_01,
-   f'{dt_now}_material_master_c.csv',
-   "text/csv",
+download_frame(
+   "📥 Download EPM GUA Material Master",
+   df_mm_c,
+   'material_master_c',
+   None,
+   f'{dt_now}_material_master_c',
    key='download-csv-01'
 )
 
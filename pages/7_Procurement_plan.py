@@ -1,44 +1,22 @@
 #%% Importing packages
 
 import streamlit as st
-import io
 from datetime import datetime
 
-import pandas as pd
-
-#%% functions
-
-@st.cache_data
-def load_versions_mp():
-    # Initialize connection.
-    conn = st.connection("postgresql", type="sql")
-    # Perform query
-    df = conn.query('SELECT DISTINCT(version) AS version FROM clean_real_mp ORDER BY version DESC', ttl="10m")
-    return df
-
-@st.cache_data
-def load_data_mp(version_list):
-    # Initialize connection.
-    conn = st.connection("postgresql", type="sql")
-    # Build query with placeholders
-    query = "SELECT * FROM clean_real_mp WHERE version = ANY(:versions)"
-    # Run query safely
-    df = conn.query(query, params={"versions": version_list}, ttl="10m")
-    return df
-
-@st.cache_data
-def convert_df(df):
-    # Convert DataFrame to CSV in memory with UTF-8 BOM encoding
-    output = io.BytesIO()
-    df.to_csv(output, index=True, encoding='utf-8-sig')  # <-- BOM added here
-    return output.getvalue()
+from utils.catalog import get_versions_mp
+from utils.compare import load_changed_deltas, load_sku_deltas
+from utils.exports import download_frame
+from utils.loaders import load_company_schema, load_mp_sku, load_mp_skus
+from utils.prefetch import prefetch
+from utils.schema import COMPANIES
+from utils.tables import render_paged_frame
 
 #%% Version selection
 
 st.title('MP version')
 
 data_load_state = st.text('Loading data...')
-df_versions = load_versions_mp()
+df_versions = get_versions_mp('clean_real_mp')
 data_load_state.text("Done! (using st.cache_data)")
 
 option = st.selectbox(
@@ -47,10 +25,21 @@ option = st.selectbox(
     )
 st.write("You selected:", option)
 
+# the data users usually open next is loaded in the background
+prefetch('clean_real_mp', option)
+
 #%% Loading data
 
-data_load_state = st.text('Loading MP...')
-data = load_data_mp([option])
+# purchase quantity, type and valuation per company
+schema = load_company_schema('clean_real_mp')
+cols_procurement= ['sku']
+for str_company in COMPANIES:
+    for str_base in ['inventory_purchase', 'purchase_type', 'inventory_purchase_valuation']:
+        cols_procurement.append(schema[str_base][str_company])
+cols_procurement.append('year_month')
+
+data_load_state = st.text('Loading MP SKUs...')
+df_skus = load_mp_skus('clean_real_mp', [option]).set_index('sku')
 data_load_state.text("Done! (using st.cache_data)")
 
 #%% Main
@@ -58,57 +47,72 @@ data_load_state.text("Done! (using st.cache_data)")
 st.title('SKU procurement')
 
 # Selection of SKU of interest
-option= st.selectbox(
+option_sku= st.selectbox(
     "Select SKU:",
-    [""]+list(data['sku'].unique()))
+    [""]+list(df_skus.index),
+    format_func= lambda x: f"{x} ~ {df_skus.loc[x, 'sku_description']}" if x else x)
 
-if option:
-    # Creating dictionaries
-    dict_sku_description= dict(zip(data['sku'], data['sku_description']))
-    dict_sku_family= dict(zip(data['sku'], data['sku_family']))
-    
-    df= data[data['sku'].isin([option])]
-    
-    cols=  ['sku',
-            'inventory_purchase_eegsa',
-            'purchase_type_eegsa',
-            'inventory_purchase_eegsa_valuation',
-            'inventory_purchase_trelec',
-            'purchase_type_trelec',
-            'inventory_purchase_trelec_valuation',
-            'inventory_purchase_amesa',
-            'purchase_type_amesa',
-            'inventory_purchase_amesa_valuation',
-            'inventory_purchase_energica',
-            'purchase_type_energica',
-            'inventory_purchase_energica_valuation',
-            'year_month']
-    
-    df= df[cols]
+if option_sku:
+    # loading only the rows of that sku
+    df= load_mp_sku('clean_real_mp', [option], option_sku, columns=cols_procurement)
     
     st.header("SKU basic information")
     
-    st.write(f'SKU Description: {dict_sku_description[option]}')
-    st.write(f'SKU family: {dict_sku_family[option]}')
+    st.write(f'SKU Description: {df_skus.loc[option_sku, "sku_description"]}')
+    st.write(f'SKU family: {df_skus.loc[option_sku, "sku_family"]}')
     st.write('All currencies in GTQ')
     
     df= df.set_index('year_month')
     
     st.header("Procurement need per SKU")
-    st.dataframe(df)
+    render_paged_frame(df, 'procurement', int_page_size=100)
     
     #date
     dt_now= datetime.now()
     dt_now= dt_now.strftime('%Y%m%d')
     
-    csv_00 = convert_df(df)
-    st.download_button(
-        "📥 Download purchase plan per sku and all companies (.csv)",
-        csv_00,
-        f'{dt_now}_pp_all.csv',
-        "text/csv",
-        key='download-csv-00'
+    download_frame(
+        "📥 Download purchase plan per sku and all companies",
+        df,
+        'pp_sku',
+        ('clean_real_mp', option, option_sku),
+        f'{dt_now}_pp_all',
+        key='download-csv-00',
+        index=True
     )
 
 else:
     st.warning("Please make selection to continue.")
+
+#%% Version comparison
+
+st.title('Version comparison')
+
+option_compare= st.selectbox(
+    "Select an MP version to compare with:",
+    [""]+[elem for elem in df_versions['version'] if elem != option])
+
+if option_compare:
+    data_load_state = st.text('Comparing MP versions...')
+    df_changed= load_changed_deltas('clean_real_mp', option, option_compare)
+    data_load_state.text("Done! (using st.cache_resource)")
+    
+    st.write(f'{df_changed["sku"].nunique()} SKUs and {df_changed.shape[0]} SKU-months changed from {option_compare} to {option}')
+    
+    if option_sku:
+        st.header(f"Changes per SKU ({option} - {option_compare})")
+        st.dataframe(load_sku_deltas('clean_real_mp', option, option_compare, option_sku).set_index('year_month'))
+    
+    #date
+    dt_now= datetime.now()
+    dt_now= dt_now.strftime('%Y%m%d')
+    
+    download_frame(
+        "📥 Download changes between versions for all SKUs",
+        df_changed.set_index(['sku', 'year_month']),
+        'pp_changes',
+        ('clean_real_mp', option, option_compare),
+        f'{dt_now}_pp_changes_{option}_{option_compare}',
+        key='download-csv-01',
+        index=True
+    )
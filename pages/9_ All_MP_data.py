@@ -1,42 +1,21 @@
 #%% Importing packages
 
 import streamlit as st
-import io
 from datetime import datetime
 
-#%% functions
-
-@st.cache_data
-def load_versions_mp():
-    # Initialize connection.
-    conn = st.connection("postgresql", type="sql")
-    # Perform query
-    df = conn.query('SELECT DISTINCT(version) AS version FROM clean_real_mp ORDER BY version DESC', ttl="10m")
-    return df
-
-@st.cache_data
-def load_data_mp(version_list):
-    # Initialize connection.
-    conn = st.connection("postgresql", type="sql")
-    # Build query with placeholders
-    query = "SELECT * FROM clean_real_mp WHERE version = ANY(:versions)"
-    # Run query safely
-    df = conn.query(query, params={"versions": version_list}, ttl="10m")
-    return df
-
-@st.cache_data
-def convert_df(df):
-    # Convert DataFrame to CSV in memory with UTF-8 BOM encoding
-    output = io.BytesIO()
-    df.to_csv(output, index=False, encoding='utf-8-sig')  # <-- BOM added here
-    return output.getvalue()
+from utils.catalog import get_versions_mp
+from utils.exports import download_mp
+from utils.loaders import filter_company_columns, load_mp_columns, load_mp_count, load_mp_page
+from utils.prefetch import prefetch
+from utils.schema import COMPANIES
+from utils.tables import render_paged_query
 
 #%% Version selection
 
 st.title('MP version')
 
 data_load_state = st.text('Loading data...')
-df_versions = load_versions_mp()
+df_versions = get_versions_mp('clean_real_mp')
 data_load_state.text("Done! (using st.cache_data)")
 
 option = st.selectbox(
@@ -45,11 +24,29 @@ option = st.selectbox(
     )
 st.write("You selected:", option)
 
-#%% Loading data
+# the data users usually open next is loaded in the background
+prefetch('clean_real_mp', option)
 
-data_load_state = st.text('Loading MP...')
-data = load_data_mp([option])
-data_load_state.text("Done! (using st.cache_data)")
+#%% Browse all SKUs
+
+st.header("Browse all MP data")
+st.write('Search by SKU code or description, only the visible page is loaded')
+
+option_company= st.selectbox(
+    "Select the company or all:",
+    ['all']+COMPANIES)
+
+cols_mp= load_mp_columns('clean_real_mp')
+if option_company != 'all':
+    cols_mp= filter_company_columns(cols_mp, [option_company])
+
+# rows are counted, filtered, sorted and sliced by the database
+render_paged_query(
+    'browse-mp',
+    lambda str_query: load_mp_count('clean_real_mp', [option], str_query),
+    lambda int_offset, int_limit, sort_by, ascending, str_query: load_mp_page(
+        'clean_real_mp', [option], cols_mp, int_offset, int_limit, sort_by, ascending, str_query),
+    cols_mp)
 
 #%% website
 
@@ -59,12 +56,12 @@ st.header("Download all MP Data")
 dt_now= datetime.now()
 dt_now= dt_now.strftime('%Y%m%d')
 
-csv_00 = convert_df(data)
-st.download_button(
-    "📥 Download all Material Planning data (.csv)",
-    csv_00,
-    f'{dt_now}_all_mrp.csv',
-    "text/csv",
+# the file is streamed to disk only when the button is clicked
+download_mp(
+    "📥 Download all Material Planning data",
+    'clean_real_mp',
+    [option],
+    f'{dt_now}_all_mrp',
     key='download-csv-00'
 )
 
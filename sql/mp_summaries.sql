@@ -0,0 +1,37 @@
+-- Per-version summaries of the MP tables, so that pages do not aggregate raw rows.
+-- Refreshed for a version by `python -m utils.catalog <table> <version>`; pages fall
+-- back to aggregating the MP table for versions missing from mp_summary_versions.
+-- {version_type} is the type of the version column of the MP tables.
+
+CREATE TABLE IF NOT EXISTS mp_summary_versions (
+    table_name    text        NOT NULL,
+    version       {version_type} NOT NULL,
+    refreshed_at  timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (table_name, version)
+);
+
+-- valuations and purchases per month and company (Inventory & Purchase amount page)
+CREATE TABLE IF NOT EXISTS mp_summary_company_month (
+    table_name           text             NOT NULL,
+    version              {version_type} NOT NULL,
+    year                 text             NOT NULL,
+    year_month           text             NOT NULL,
+    company              text             NOT NULL,
+    inventory_valuation  double precision NOT NULL,
+    purchase_valuation   double precision NOT NULL,
+    purchase_qty         double precision NOT NULL,
+    PRIMARY KEY (table_name, version, year_month, company)
+);
+
+-- alert flags and final state per SKU and company (Alerts page)
+CREATE TABLE IF NOT EXISTS mp_summary_alerts (
+    table_name   text    NOT NULL,
+    version      {version_type} NOT NULL,
+    sku          text    NOT NULL,
+    company      text    NOT NULL,
+    stockouts    integer NOT NULL,
+    near_miss    integer NOT NULL,
+    emergency    integer NOT NULL,
+    final_state  text    NOT NULL,
+    PRIMARY KEY (table_name, version, sku, company)
+);
@@ -0,0 +1,13 @@
+-- Catalog of loaded MP versions, one row per (table, version).
+-- Filled by the MP load through `python -m utils.catalog <table> <version>`;
+-- the app lists the loaded versions with its metadata and uses it as its change token.
+-- {version_type} is the type of the version column of the MP tables.
+
+CREATE TABLE IF NOT EXISTS mp_version_catalog (
+    table_name  text        NOT NULL,
+    version     {version_type} NOT NULL,
+    row_count   bigint      NOT NULL,
+    sku_count   bigint      NOT NULL,
+    loaded_at   timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (table_name, version)
+);
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import numpy as np
+import pandas as pd
+
+import utils.simulation as simulation
+from utils.montecarlo import estimate_stockout_risk
+
+#%% Fixtures
+
+def unordered_version(monkeypatch):
+    # Rows of a full version as the SQL path returns them, in no set order: SKU A starts in
+    # January with 10 units, B in February with 12
+    dict_schema = {base: {'c1': f'{base}_c1'} for base in simulation.SIMULATION_METRICS}
+    ls_rows = []
+    for str_sku, str_month, flt_initial in [('A', '2025-03', 30), ('B', '2025-03', 5), ('A', '2025-01', 10),
+                                            ('B', '2025-02', 12), ('A', '2025-02', 20)]:
+        dict_row = {'sku': str_sku, 'year_month': str_month, 'sku_family': 'F',
+                    'lead_time_e_months': 1.0, 'lead_time_std_months': 0.0}
+        dict_row.update({f'{base}_c1': 0.0 for base in simulation.SIMULATION_METRICS})
+        dict_row['inventory_initial_new&ra_c1'] = flt_initial
+        dict_row['demand_recurrent_consumption_c1'] = 8.0
+        ls_rows.append(dict_row)
+    df = pd.DataFrame(ls_rows)
+    monkeypatch.setattr(simulation, 'COMPANIES', ['c1'])
+    monkeypatch.setattr(simulation, 'load_company_schema', lambda table: dict_schema)
+    monkeypatch.setattr(simulation, 'load_mp', lambda table, version_list, columns: df[columns])
+    return simulation.load_simulation_inputs.__wrapped__('clean_real_mp', 'v')
+
+#%% Tests
+
+def test_start_is_the_earliest_month(monkeypatch):
+    dict_inputs = unordered_version(monkeypatch)
+    assert list(dict_inputs['skus']) == ['A', 'B']
+    assert list(dict_inputs['months']) == ['2025-01', '2025-02', '2025-03']
+    np.testing.assert_array_equal(dict_inputs['start'][:, 0], [10, 12])
+
+def test_risk_starts_from_the_earliest_month(monkeypatch):
+    # without ss nor lead time deviation every path is the stored plan, 8 units a month:
+    # A runs out in February and B in March
+    dict_inputs = unordered_version(monkeypatch)
+    dict_result = estimate_stockout_risk(dict_inputs, int_paths=10)
+    np.testing.assert_array_equal(dict_result['prob_any'], [[0, 1, 1], [0, 0, 1]])
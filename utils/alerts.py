@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import numpy as np
+
+#%% Constants
+
+# (stockouts, near miss, emergency) if (0,0,0) = no emergency
+dict_variations ={
+    (1,1,1):'stockouts',
+    (1,0,1):'stockouts',
+    (1,1,0):'stockouts',
+    (0,1,1):'emergency',
+    (1,0,0):'stockouts',
+    (0,1,0):'near miss',
+    (0,0,1):'emergency',
+    (0,0,0):'no emergency'
+    }
+
+# dict_variations as an array indexed by the bitmask 4*stockouts + 2*near miss + emergency
+npa_state_lookup = np.array([dict_variations[((code >> 2) & 1, (code >> 1) & 1, code & 1)]
+                             for code in range(8)], dtype=object)
+
+#%% Functions
+
+def state_case_sql(str_stockouts, str_near_miss, str_emergency):
+    # npa_state_lookup as a SQL CASE over three 0/1 flag expressions, states are classified by Postgres
+    str_code = f'(4*({str_stockouts}) + 2*({str_near_miss}) + ({str_emergency}))'
+    str_whens = ' '.join(f"WHEN {code} THEN '{state}'" for code, state in enumerate(npa_state_lookup))
+    return f'CASE {str_code} {str_whens} END'
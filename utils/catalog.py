@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import os
+import sys
+
+from sqlalchemy import text
+
+from utils.db import get_engine, read_sql
+from utils.instrumentation import cached
+from utils.loaders import check_table
+from utils.summaries import create_tables, native_version, refresh_summaries, version_type
+
+#%% Constants
+
+CATALOG_SQL = os.path.join(os.path.dirname(__file__), '..', 'sql', 'mp_version_catalog.sql')
+
+# version lists kept, a couple of change tokens per MP table: older tokens are never asked for again
+MAX_CACHED_TOKENS = 8
+
+# distinct versions of an MP table, one index probe per version instead of a scan of every row
+_VERSIONS_SQL = """
+    WITH RECURSIVE v AS (
+        (SELECT version FROM {table} ORDER BY version LIMIT 1)
+        UNION ALL
+        SELECT (SELECT t.version FROM {table} t WHERE t.version > v.version ORDER BY t.version LIMIT 1)
+        FROM v
+        WHERE v.version IS NOT NULL)
+    SELECT version FROM v WHERE version IS NOT NULL"""
+
+#%% Functions
+
+@cached(ttl="10m")
+def catalog_exists():
+    # The catalog table is optional, without it versions have no metadata and MAX(version) is the change token
+    df = read_sql("SELECT to_regclass('mp_version_catalog') IS NOT NULL AS catalog_exists")
+    return bool(df['catalog_exists'].iloc[0])
+
+# rows written to a table since the statistics were reset, moves with any load even if it is not registered
+_WRITES_SQL = """
+    (SELECT n_tup_ins + n_tup_upd + n_tup_del
+     FROM pg_stat_user_tables
+     WHERE relid = to_regclass(:table)) AS n_writes"""
+
+@cached(ttl="1m")
+def load_change_token(table):
+    # Cheap token that only changes when a version is loaded or registered
+    if catalog_exists():
+        query = f"""
+            SELECT COUNT(*) AS n_versions, MAX(loaded_at)::text AS last_loaded, {_WRITES_SQL}
+            FROM mp_version_catalog
+            WHERE table_name = :table"""
+    else:
+        # index-only lookup when version is indexed
+        query = f"SELECT MAX(version)::text AS last_version, {_WRITES_SQL} FROM {check_table(table)}"
+    df = read_sql(query, {"table": check_table(table)})
+    return tuple(df.iloc[0])
+
+@cached(max_entries=MAX_CACHED_TOKENS)
+def load_versions_mp(table, token):
+    # Versions of the MP table, newest first, cached until the change token moves: the registered ones
+    # with their metadata come from the catalog, versions loaded before the catalog existed or never
+    # registered are looked up in the MP table and have none
+    str_versions = _VERSIONS_SQL.format(table=check_table(table))
+    if catalog_exists():
+        query = f"""
+            SELECT version, row_count, sku_count, loaded_at
+            FROM mp_version_catalog
+            WHERE table_name = :table
+            UNION ALL
+            SELECT v.version, NULL, NULL, NULL
+            FROM ({str_versions}) v
+            WHERE NOT EXISTS (SELECT 1 FROM mp_version_catalog c
+                              WHERE c.table_name = :table AND c.version = v.version)
+            ORDER BY version DESC"""
+        return read_sql(query, {"table": table})
+    # Perform query
+    return read_sql(f'SELECT version FROM ({str_versions}) v ORDER BY version DESC')
+
+def get_versions_mp(table):
+    return load_versions_mp(table, load_change_token(table))
+
+def register_version(table, version, engine=None):
+    # Records a freshly loaded version, run by the MP load once the rows are written
+    with (engine or get_engine()).begin() as connection:
+        # versions are stored and compared with the type of the MP table, not as text
+        str_type = version_type(connection, check_table(table))
+        create_tables(connection, CATALOG_SQL, str_type, ['mp_version_catalog'])
+        version = native_version(connection, str_type, version)
+        connection.execute(text(f"""
+            INSERT INTO mp_version_catalog (table_name, version, row_count, sku_count, loaded_at)
+            SELECT :table, :version, COUNT(*), COUNT(DISTINCT sku), now()
+            FROM {check_table(table)}
+            WHERE version = :version
+            ON CONFLICT (table_name, version) DO UPDATE
+            SET row_count = EXCLUDED.row_count,
+                sku_count = EXCLUDED.sku_count,
+                loaded_at = EXCLUDED.loaded_at"""),
+            {"table": table, "version": version})
+        # per-version summaries read by the pages, in the same transaction
+        refresh_summaries(connection, table, version)
+
+#%% Main
+
+if __name__ == '__main__':
+    # usage: python -m utils.catalog <table> <version>
+    register_version(sys.argv[1], sys.argv[2])
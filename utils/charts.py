@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import numpy as np
+import plotly.graph_objects as go
+
+from utils.instrumentation import instrumented
+
+#%% Constants
+
+# Define colors (contrast-friendly)
+colors = {
+    'reorder': '#2ca02c',     # green
+    'safety': '#d62728',      # red
+    'min_stock': '#9467bd',   # purple
+    'inventory_line': '#1f77b4',  # blue
+}
+
+grid_color = '#f0f0f0'
+plotly_template = 'plotly_dark'
+text_color = 'black'
+
+#%% Functions
+
+def mrp_inventory_path(npa_initial, npa_final):
+    # Sawtooth inventory path as one polyline:
+    # (j, initial_j) -> (j, final_j) -> (j+1, initial_j+1) -> ... -> (n-1, initial_n-1)
+    npa_initial = np.asarray(npa_initial, dtype=float)
+    npa_final = np.asarray(npa_final, dtype=float)
+    int_window = npa_initial.shape[0]
+    if int_window < 2:
+        return np.array([], dtype=int), np.array([], dtype=float)
+
+    npa_x = np.empty(2*int_window - 1, dtype=int)
+    npa_x[0::2] = np.arange(int_window)
+    npa_x[1::2] = np.arange(int_window - 1)
+
+    npa_y = np.empty(2*int_window - 1, dtype=float)
+    npa_y[0::2] = npa_initial
+    npa_y[1::2] = npa_final[:-1]
+    return npa_x, npa_y
+
+@instrumented
+def build_mrp_figure(df_final, str_title):
+    int_window = df_final.shape[0]
+    npa_x = np.arange(int_window)
+
+    fig_mrp = go.Figure()
+
+    # Inventory within and across months, a single trace
+    npa_path_x, npa_path_y = mrp_inventory_path(df_final['inventory_initial_new&ra'].values,
+                                                df_final['inventory_final_new&ra'].values)
+    fig_mrp.add_trace(go.Scatter(
+        x=npa_path_x,
+        y=npa_path_y,
+        mode='lines',
+        line=dict(color=colors["inventory_line"], dash='dash', width=1),
+        name="Inventory Flow",
+        showlegend=True
+    ))
+
+    # RP, SS, Min stock
+    fig_mrp.add_trace(go.Scatter(
+        y=df_final['rp_inventory'].values,
+        x=npa_x,
+        name='Reorder Point',
+        line=dict(color=colors["reorder"], width=2)
+    ))
+
+    fig_mrp.add_trace(go.Scatter(
+        y=df_final['ss_inventory'].values,
+        x=npa_x,
+        name='Safety Stock',
+        line=dict(color=colors["safety"], width=2)
+    ))
+
+    fig_mrp.add_trace(go.Scatter(
+        y=df_final['demand_min_stock'].values,
+        x=npa_x,
+        name='Min Stock',
+        line=dict(color=colors["min_stock"], width=2)
+    ))
+
+    # Layout
+    fig_mrp.update_layout(
+        title=dict(text=str_title, font=dict(color=text_color)),
+        paper_bgcolor='white',  # Full background
+        plot_bgcolor='white',   # Plot area
+        legend = dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="center",
+            x=0.5,
+            font=dict(color=text_color)
+            ),
+        xaxis=dict(
+            tickmode='array',
+            tickvals=npa_x,
+            ticktext=df_final.index.tolist(),
+            tickangle=45,
+            tickfont=dict(size=8, color=text_color),
+            title=dict(text='year_month', font=dict(color=text_color)),
+            range=[-0.5, int_window - 1 + 0.5],
+            showgrid=True,
+            gridcolor=grid_color,
+            gridwidth=1
+        ),
+        yaxis=dict(
+            title=dict(text='Inventory (#)', font=dict(color=text_color)),
+            tickfont=dict(size=8, color=text_color),
+            showgrid=True,
+            gridcolor=grid_color,
+            gridwidth=1
+        ),
+        template=plotly_template,
+        height=500,
+        margin=dict(l=60, r=40, b=80, t=60)
+    )
+    return fig_mrp
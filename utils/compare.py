@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import cached, instrumented
+from utils.loaders import load_company_schema, load_mp
+from utils.schema import company_columns
+
+#%% Constants
+
+# quantities compared between versions, per company
+DELTA_METRICS = ['inventory_purchase',
+                 'inventory_final_new&ra',
+                 'rp_inventory',
+                 'ss_inventory']
+
+KEYS = ['sku', 'year_month']
+
+# version pairs kept by the shared delta caches
+MAX_CACHED_PAIRS = 4
+
+#%% Functions
+
+@instrumented
+def compute_version_deltas(df_new, df_old, schema):
+    # Per (sku, year_month) deltas new - old for every metric and company in one pass,
+    # rows only present in one version count the other one as zero
+    ls_metric_cols = [col for base in DELTA_METRICS for col in company_columns(schema, base)]
+    ls_type_cols = company_columns(schema, 'purchase_type')
+    ls_cols = ls_metric_cols + ls_type_cols
+
+    df = df_new[KEYS+ls_cols].merge(df_old[KEYS+ls_cols],
+                                    on=KEYS,
+                                    how='outer',
+                                    suffixes=('_new', '_old'),
+                                    indicator='status')
+    df['status'] = df['status'].map({'both': 'both', 'left_only': 'added', 'right_only': 'removed'})
+
+    npa_new = df[[f'{col}_new' for col in ls_metric_cols]].to_numpy(dtype=float)
+    npa_old = df[[f'{col}_old' for col in ls_metric_cols]].to_numpy(dtype=float)
+    npa_delta = np.nan_to_num(npa_new) - np.nan_to_num(npa_old)
+
+    df_delta = pd.DataFrame(npa_delta,
+                            columns=[f'{col}_delta' for col in ls_metric_cols],
+                            index=df.index)
+
+    # purchase type changes, old -> new
+    npa_type_new = df[[f'{col}_new' for col in ls_type_cols]].to_numpy(dtype=object)
+    npa_type_old = df[[f'{col}_old' for col in ls_type_cols]].to_numpy(dtype=object)
+    npa_changed = pd.isna(npa_type_new) != pd.isna(npa_type_old)
+    npa_changed |= ~pd.isna(npa_type_new) & (npa_type_new != npa_type_old)
+    df_changed = pd.DataFrame(npa_changed,
+                              columns=[f'{col}_changed' for col in ls_type_cols],
+                              index=df.index)
+
+    df_out = pd.concat([df[KEYS+['status']],
+                        df_delta,
+                        df[[f'{col}_{str_suffix}' for col in ls_type_cols for str_suffix in ('old', 'new')]],
+                        df_changed], axis=1)
+    df_out['changed'] = (npa_delta != 0).any(axis=1) | npa_changed.any(axis=1) | (df_out['status'] != 'both')
+    return df_out.sort_values(KEYS).reset_index(drop=True)
+
+@cached(resource=True, max_entries=MAX_CACHED_PAIRS)
+def load_version_deltas(table, version_new, version_old):
+    # Deltas between two versions, cached per version pair and shared by every session, read-only
+    schema = load_company_schema(table)
+    ls_cols = KEYS + [col for base in DELTA_METRICS+['purchase_type'] for col in company_columns(schema, base)]
+    df_new = load_mp(table, [version_new], columns=ls_cols)
+    df_old = load_mp(table, [version_old], columns=ls_cols)
+    return compute_version_deltas(df_new, df_old, schema)
+
+@cached(resource=True, max_entries=MAX_CACHED_PAIRS)
+def load_version_deltas_rows(table, version_new, version_old):
+    # Row positions of each SKU in the shared deltas frame
+    df_deltas = load_version_deltas(table, version_new, version_old)
+    return df_deltas.groupby('sku', observed=True, sort=False).indices
+
+@cached(resource=True, max_entries=MAX_CACHED_PAIRS)
+def load_changed_deltas(table, version_new, version_old):
+    # Changed rows of the shared deltas frame, read-only
+    df_deltas = load_version_deltas(table, version_new, version_old)
+    return df_deltas[df_deltas['changed']]
+
+def load_sku_deltas(table, version_new, version_old, sku):
+    # Deltas of a single SKU, a small copy of the shared frame
+    df_deltas = load_version_deltas(table, version_new, version_old)
+    npa_rows = load_version_deltas_rows(table, version_new, version_old).get(sku, [])
+    return df_deltas.iloc[npa_rows]
+
+def sum_company_deltas(df_deltas, schema, companies=None):
+    # One delta column per metric with the sum over the selected companies
+    dict_sums = {}
+    for base in DELTA_METRICS:
+        ls_cols = [f'{col}_delta' for col in company_columns(schema, base, companies)]
+        dict_sums[f'{base}_delta'] = df_deltas[ls_cols].sum(axis=1)
+    return pd.DataFrame(dict_sums, index=df_deltas.index)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import threading
+import time
+from collections import deque
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from utils.instrumentation import instrumented
+
+#%% Constants
+
+# pool defaults, overridable in the [connections.postgresql] secrets section
+POOL_DEFAULTS = {
+    'pool_size': 10,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'statement_timeout_ms': 120000
+    }
+
+#%% Pool instrumentation
+
+_lock = threading.Lock()
+_checkout_waits = deque(maxlen=1000)
+_counters = {'checkouts': 0, 'timeouts': 0, 'connects': 0, 'closes': 0}
+
+def _count(str_key):
+    with _lock:
+        _counters[str_key] += 1
+
+def pool_stats():
+    # Current pool occupancy and recent checkout wait times, in milliseconds
+    engine = get_engine()
+    with _lock:
+        npa_waits = np.array(_checkout_waits, dtype=float)*1000
+        dict_stats = dict(_counters)
+    dict_stats.update({
+        'pool_size': engine.pool.size(),
+        'checked_out': engine.pool.checkedout(),
+        'checked_in': engine.pool.checkedin(),
+        'overflow': engine.pool.overflow(),
+        'open_connections': dict_stats['connects'] - dict_stats['closes'],
+        'wait_ms_p50': float(np.percentile(npa_waits, 50)) if npa_waits.size else 0.0,
+        'wait_ms_p95': float(np.percentile(npa_waits, 95)) if npa_waits.size else 0.0,
+        'wait_ms_max': float(npa_waits.max()) if npa_waits.size else 0.0
+        })
+    return dict_stats
+
+#%% Engine
+
+def _engine_url(dict_cfg):
+    # Same secrets format as st.connection("postgresql", type="sql")
+    if 'url' in dict_cfg:
+        return dict_cfg['url']
+    str_driver = dict_cfg['dialect'] + (f"+{dict_cfg['driver']}" if 'driver' in dict_cfg else '')
+    return URL.create(str_driver,
+                      username=dict_cfg.get('username'),
+                      password=dict_cfg.get('password'),
+                      host=dict_cfg.get('host'),
+                      port=dict_cfg.get('port'),
+                      database=dict_cfg.get('database'),
+                      query=dict_cfg.get('query', {}))
+
+@st.cache_resource
+def get_engine():
+    # One pooled engine per server process, shared by every page and session
+    dict_cfg = dict(st.secrets['connections']['postgresql'])
+    dict_pool = {key: dict_cfg.get(key, value) for key, value in POOL_DEFAULTS.items()}
+
+    engine = create_engine(
+        _engine_url(dict_cfg),
+        pool_size=int(dict_pool['pool_size']),
+        max_overflow=int(dict_pool['max_overflow']),
+        pool_timeout=float(dict_pool['pool_timeout']),
+        pool_recycle=int(dict_pool['pool_recycle']),
+        pool_pre_ping=True,
+        connect_args={'options': f"-c statement_timeout={int(dict_pool['statement_timeout_ms'])}"})
+
+    event.listen(engine.pool, 'connect', lambda *args: _count('connects'))
+    event.listen(engine.pool, 'close', lambda *args: _count('closes'))
+    event.listen(engine.pool, 'close_detached', lambda *args: _count('closes'))
+    return engine
+
+def connect():
+    # Pool checkout, timing how long the session waited for a connection
+    t0 = time.perf_counter()
+    try:
+        connection = get_engine().connect()
+    except PoolTimeoutError:
+        _count('timeouts')
+        raise
+    with _lock:
+        _checkout_waits.append(time.perf_counter() - t0)
+        _counters['checkouts'] += 1
+    return connection
+
+@instrumented
+def read_sql(query, params=None):
+    # Run query safely on a pooled connection, returned to the pool right after
+    with connect() as connection:
+        return pd.read_sql(text(query), connection, params=params or {})
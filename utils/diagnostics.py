@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import os
+
+import streamlit as st
+
+from utils.db import pool_stats
+from utils.dtypes import dtype_reports
+from utils.instrumentation import clear_history, history
+from utils.prefetch import prefetch_stats
+from utils.snapshots import SNAPSHOT_DIR
+
+#%% Functions
+
+def summarize_history(df):
+    # Calls, hit rate, latency and size per instrumented function
+    if df.empty:
+        return df
+    df = df.assign(hit=(df['cache'] == 'hit').astype(float).where(df['cache'] != 'n/a'),
+                   mb=df['bytes']/1024**2)
+    df_summary = df.groupby('name').agg(calls=('seconds', 'size'),
+                                        hit_rate=('hit', 'mean'),
+                                        seconds_p50=('seconds', 'median'),
+                                        seconds_p95=('seconds', lambda x: x.quantile(0.95)),
+                                        seconds_total=('seconds', 'sum'),
+                                        rows_mean=('rows', 'mean'),
+                                        mb_mean=('mb', 'mean'))
+    return df_summary.sort_values('seconds_total', ascending=False).round(4)
+
+def snapshot_stats():
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return {'snapshots': 0, 'size_mb': 0.0}
+    ls_sizes = [entry.stat().st_size for entry in os.scandir(SNAPSHOT_DIR)
+                if entry.is_file() and entry.name.endswith('.arrow')]
+    return {'snapshots': len(ls_sizes), 'size_mb': round(sum(ls_sizes)/1024**2, 1)}
+
+def render_diagnostics():
+    # Hidden page, reachable through ?diagnostics in the app URL
+    st.title('Diagnostics')
+
+    df = history()
+
+    st.header('Loaders and transforms')
+    st.write('Latency in seconds, cache hit rate and returned frame size (shallow memory)')
+    st.dataframe(summarize_history(df))
+
+    st.header('Dtype normalization')
+    st.write('Memory of the loaded MP frames before and after normalization, in MB')
+    df_dtypes = dtype_reports()
+    st.write(f"Saved: {df_dtypes['mb_saved'].sum():.1f} MB over {len(df_dtypes)} loads")
+    st.dataframe(df_dtypes.sort_values('time', ascending=False), use_container_width=True)
+
+    st.header('Connection pool')
+    st.dataframe(pool_stats(), use_container_width=True)
+
+    st.header('Snapshot store')
+    st.write(SNAPSHOT_DIR)
+    st.dataframe(snapshot_stats(), use_container_width=True)
+
+    st.header('Background prefetch')
+    st.dataframe(prefetch_stats(), use_container_width=True)
+
+    st.header('Recent calls')
+    st.dataframe(df.sort_values('time', ascending=False).head(500), use_container_width=True)
+
+    if st.button('Clear history'):
+        clear_history()
+        st.rerun()
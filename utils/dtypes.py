@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import threading
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.instrumentation import instrumented
+
+#%% Constants
+
+# text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+# smaller frames (e.g. a single SKU) are returned as loaded, normalizing them costs more than it saves
+NORMALIZE_MIN_ROWS = 10000
+
+#%% Registry
+
+# memory before and after each normalization, shared by all sessions
+_lock = threading.Lock()
+_reports = deque(maxlen=500)
+
+def dtype_reports():
+    with _lock:
+        return pd.DataFrame(list(_reports),
+                            columns=['time', 'name', 'rows', 'mb_before', 'mb_after', 'mb_saved'])
+
+#%% Functions
+
+def frame_bytes(df):
+    # Deep memory, strings included
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def _is_text(s):
+    return s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) == 'string'
+
+def _downcast_float(s):
+    # float32 only when every value survives the round trip, valuations usually stay float64
+    npa = s.to_numpy()
+    npa_32 = npa.astype(np.float32)
+    if np.array_equal(npa_32.astype(np.float64), npa, equal_nan=True):
+        return pd.Series(npa_32, index=s.index, name=s.name)
+    return s
+
+def text_categories(tbl):
+    # Text columns of an Arrow table worth decoding straight to categoricals, without Python strings
+    if tbl.num_rows < NORMALIZE_MIN_ROWS:
+        return []
+    return [field.name for field in tbl.schema
+            if (pa.types.is_string(field.type) or pa.types.is_large_string(field.type))
+            and pc.count_distinct(tbl.column(field.name)).as_py() <= CATEGORY_MAX_RATIO*tbl.num_rows]
+
+def year_month_categorical(s):
+    # 'YYYY-MM' sorts chronologically as text, so the ordered categories are the months in order
+    return pd.Categorical(s, categories=sorted(s.dropna().unique()), ordered=True)
+
+@instrumented
+def normalize_mp_frame(df, str_name='mp', bool_downcast=True):
+    # Repeated text as categoricals, year_month as ordered months, numerics downcast without loss
+    if len(df) < NORMALIZE_MIN_ROWS:
+        return df
+    int_before = frame_bytes(df)
+    dict_cols = {}
+    for col in df.columns:
+        s = df[col]
+        if col == 'year_month' and (_is_text(s) or isinstance(s.dtype, pd.CategoricalDtype)):
+            dict_cols[col] = year_month_categorical(s)
+        elif _is_text(s):
+            if s.nunique(dropna=True) <= CATEGORY_MAX_RATIO*len(s):
+                dict_cols[col] = s.astype('category')
+        elif not bool_downcast:
+            continue
+        elif pd.api.types.is_float_dtype(s):
+            dict_cols[col] = _downcast_float(s)
+        elif pd.api.types.is_integer_dtype(s):
+            dict_cols[col] = pd.to_numeric(s, downcast='integer')
+    # shallow copy, the untouched columns stay views of the loaded frame
+    df = df.copy(deep=False)
+    for col, values in dict_cols.items():
+        df[col] = values
+
+    int_after = frame_bytes(df)
+    with _lock:
+        _reports.append({
+            'time': datetime.now(),
+            'name': str_name,
+            'rows': len(df),
+            'mb_before': int_before/1024**2,
+            'mb_after': int_after/1024**2,
+            'mb_saved': (int_before - int_after)/1024**2
+            })
+    return df
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import gzip
+import hashlib
+import importlib.util
+import os
+import re
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+from sqlalchemy import text
+
+from utils.db import connect
+from utils.instrumentation import instrumented
+from utils.loaders import check_table
+from utils.snapshots import evict_files, read_snapshot
+
+#%% Constants
+
+# exported files are keyed by what they contain (table, version, filters) and reused across sessions
+EXPORT_DIR = os.environ.get('MP_EXPORT_DIR',
+                            os.path.join(tempfile.gettempdir(), 'mp_exports'))
+
+# size of the export store before the least recently used files are evicted
+EXPORT_MAX_BYTES = int(float(os.environ.get('MP_EXPORT_MAX_GB', '2'))*1024**3)
+
+# rows fetched from the server-side cursor and written per step
+EXPORT_CHUNKSIZE = 50000
+
+# format: (file extension, mime type), xlsx only when openpyxl is installed
+FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'csv (gzip)': ('csv.gz', 'application/gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet')
+    }
+if importlib.util.find_spec('openpyxl') is not None:
+    FORMATS['xlsx'] = ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+# Excel sheet limit, header included
+XLSX_MAX_ROWS = 1048575
+
+#%% Helpers
+
+def export_path(str_name, key_parts, str_format):
+    # Same (name, key, format) -> same file, no hashing of the data itself
+    str_hash = hashlib.sha256(repr((str_name, tuple(key_parts), str_format)).encode()).hexdigest()[:20]
+    str_name = re.sub(r'[^0-9A-Za-z_-]', '_', str_name)
+    return os.path.join(EXPORT_DIR, f'{str_name}__{str_hash}.{FORMATS[str_format][0]}')
+
+def frame_token(df):
+    # Key part for data without a version (material master, projects): a hash of the rows,
+    # so the file always holds what the page shows
+    npa_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    return hashlib.sha256(npa_hashes.tobytes() + repr(list(df.columns)).encode()).hexdigest()[:20]
+
+def _write_atomic(path, write):
+    # Writing to a temporary file first so readers never see a partial export
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path_tmp = tempfile.mkstemp(dir=EXPORT_DIR, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(path_tmp)
+        os.replace(path_tmp, path)
+    except BaseException:
+        os.remove(path_tmp)
+        raise
+    evict_files(EXPORT_DIR, EXPORT_MAX_BYTES, tuple(f'.{ext}' for ext, _ in FORMATS.values()))
+    return path
+
+def read_export(path):
+    # Bytes of an exported file for st.download_button, which keeps them in memory until the
+    # session reruns: the handle is closed right away
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _reuse(path):
+    # touching the file keeps it at the end of the eviction queue
+    if os.path.exists(path):
+        os.utime(path)
+        return True
+    return False
+
+#%% Frames
+
+def write_frame(df, path, str_format, index=False):
+    # utf-8-sig keeps the BOM that Excel needs to read accents in the csv formats
+    if str_format == 'csv':
+        df.to_csv(path, index=index, encoding='utf-8-sig')
+    elif str_format == 'csv (gzip)':
+        df.to_csv(path, index=index, encoding='utf-8-sig', compression='gzip')
+    elif str_format == 'parquet':
+        df.to_parquet(path, index=index)
+    elif str_format == 'xlsx':
+        if len(df) > XLSX_MAX_ROWS:
+            raise ValueError(f'{len(df)} rows do not fit in an xlsx sheet')
+        # through a file object, the temporary name has no .xlsx extension to infer the engine from
+        with open(path, 'wb') as f:
+            df.to_excel(f, index=index, engine='openpyxl')
+    else:
+        raise ValueError(f'Unknown export format: {str_format!r}')
+
+@instrumented
+def export_frame(df, str_name, key_parts, str_format, index=False):
+    # Written once per (name, key, format), later calls return the existing file,
+    # without key parts the file is keyed on the frame itself
+    path = export_path(str_name, (frame_token(df),) if key_parts is None else key_parts, str_format)
+    if _reuse(path):
+        return path
+    return _write_atomic(path, lambda path_tmp: write_frame(df, path_tmp, str_format, index))
+
+def download_frame(str_label, df, str_name, key_parts, str_file_stem, key, index=False):
+    # Format selector and deferred download button: nothing is hashed or written until clicked
+    col_button, col_format = st.columns([3, 1])
+    str_format = col_format.selectbox('Format', list(FORMATS), key=f'{key}-format',
+                                      label_visibility='collapsed')
+    col_button.download_button(
+        str_label,
+        lambda: read_export(export_frame(df, str_name, key_parts, str_format, index)),
+        f'{str_file_stem}.{FORMATS[str_format][0]}',
+        FORMATS[str_format][1],
+        key=key
+    )
+
+#%% MP versions
+
+def _iter_mp_chunks(table, version_list, chunksize):
+    # Arrow snapshot batches when available, otherwise a server-side cursor
+    if len(version_list) == 1:
+        tbl = read_snapshot(table, version_list[0])
+        if tbl is not None:
+            for batch in tbl.to_batches(max_chunksize=chunksize):
+                yield batch.to_pandas()
+            return
+
+    query = text(f"SELECT * FROM {check_table(table)} WHERE version = ANY(:versions)")
+    with connect().execution_options(stream_results=True,
+                                     max_row_buffer=chunksize) as connection:
+        for chunk in pd.read_sql(query, connection,
+                                 params={"versions": list(version_list)},
+                                 chunksize=chunksize):
+            yield chunk
+
+def _write_mp_chunks(chunks, path, str_format):
+    # Chunk by chunk, peak memory is one chunk
+    if str_format in ('csv', 'csv (gzip)'):
+        opener = gzip.open if str_format == 'csv (gzip)' else open
+        # utf-8-sig writes the BOM only once, at the start of the file
+        with opener(path, 'wt', encoding='utf-8-sig', newline='') as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, index=False, header=(i == 0))
+    elif str_format == 'parquet':
+        writer = None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                    writer = pq.ParquetWriter(path, schema)
+                # later chunks are cast to the schema of the first one
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        # a full version does not fit in an Excel sheet
+        raise ValueError(f'MP versions cannot be exported as {str_format}')
+
+@instrumented
+def export_mp(table, version_list, str_format='csv', chunksize=EXPORT_CHUNKSIZE):
+    # Streams MP versions into a file, written once per (table, versions, format)
+    path = export_path(table, [str(elem) for elem in version_list], str_format)
+    if _reuse(path):
+        return path
+    return _write_atomic(path, lambda path_tmp: _write_mp_chunks(
+        _iter_mp_chunks(table, version_list, chunksize), path_tmp, str_format))
+
+def download_mp(str_label, table, version_list, str_file_stem, key):
+    # Deferred download of whole MP versions: the file is only generated when the button is clicked
+    col_button, col_format = st.columns([3, 1])
+    str_format = col_format.selectbox('Format', [elem for elem in FORMATS if elem != 'xlsx'],
+                                      key=f'{key}-format', label_visibility='collapsed')
+    col_button.download_button(
+        str_label,
+        lambda: read_export(export_mp(table, version_list, str_format)),
+        f'{str_file_stem}.{FORMATS[str_format][0]}',
+        FORMATS[str_format][1],
+        key=key
+    )
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import functools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import streamlit as st
+import pandas as pd
+import pyarrow as pa
+
+#%% Registry
+
+# recent calls of the instrumented loaders and transforms, shared by all sessions
+_lock = threading.Lock()
+_history = deque(maxlen=2000)
+
+# stack of the cached calls running in this thread, the innermost one is marked on a miss
+_local = threading.local()
+
+def frame_stats(result):
+    # Rows and memory of a returned frame, shallow so it stays cheap on hits
+    if isinstance(result, pd.DataFrame):
+        return len(result), int(result.memory_usage(index=True, deep=False).sum())
+    if isinstance(result, pa.Table):
+        return result.num_rows, int(result.nbytes)
+    if isinstance(result, pd.Series):
+        return len(result), int(result.memory_usage(index=True, deep=False))
+    return None, None
+
+def record(str_name, flt_seconds, result=None, str_cache='n/a'):
+    int_rows, int_bytes = frame_stats(result)
+    with _lock:
+        _history.append({
+            'time': datetime.now(),
+            'name': str_name,
+            'cache': str_cache,
+            'seconds': flt_seconds,
+            'rows': int_rows,
+            'bytes': int_bytes,
+            'thread': threading.current_thread().name
+            })
+
+def history():
+    with _lock:
+        return pd.DataFrame(list(_history),
+                            columns=['time', 'name', 'cache', 'seconds', 'rows', 'bytes', 'thread'])
+
+def clear_history():
+    with _lock:
+        _history.clear()
+
+#%% Decorators
+
+def cached(func=None, *, resource=False, **cache_kwargs):
+    # st.cache_data (or st.cache_resource) that also records latency, size and hit/miss
+    def decorator(func):
+        str_name = f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            # only runs on a cache miss
+            _local.stack[-1] = 'miss'
+            return func(*args, **kwargs)
+
+        cache = st.cache_resource if resource else st.cache_data
+        cached_func = cache(**cache_kwargs)(inner)
+
+        @functools.wraps(func)
+        def outer(*args, **kwargs):
+            if not hasattr(_local, 'stack'):
+                _local.stack = []
+            _local.stack.append('hit')
+            t0 = time.perf_counter()
+            try:
+                result = cached_func(*args, **kwargs)
+            finally:
+                str_cache = _local.stack.pop()
+            record(str_name, time.perf_counter() - t0, result, str_cache)
+            return result
+
+        outer.clear = cached_func.clear
+        return outer
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+def instrumented(func):
+    # Records latency and size of an uncached transform
+    str_name = f'{func.__module__}.{func.__qualname__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        result = func(*args, **kwargs)
+        record(str_name, time.perf_counter() - t0, result)
+        return result
+    return wrapper
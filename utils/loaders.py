@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.alerts import state_case_sql
+from utils.db import read_sql
+from utils.dtypes import normalize_mp_frame, text_categories
+from utils.instrumentation import cached
+from utils.schema import COMPANIES, build_company_schema, company_columns, company_of
+from utils.snapshots import read_snapshot, snapshot_exists, write_snapshot
+
+#%% Constants
+
+# MP tables that can be queried through this module
+MP_TABLES = ('clean_real_mp', 'clean_ideal_mp')
+
+# entries of the shared resource caches: full versions (a few per table), and projections
+# of them, several per version as each page reads its own columns
+MAX_CACHED_VERSIONS = 4
+MAX_CACHED_FRAMES = 16
+
+#%% Helpers
+
+def check_table(table):
+    # Only known MP tables can be interpolated into a query
+    if table not in MP_TABLES:
+        raise ValueError(f'Unknown MP table: {table!r}')
+    return table
+
+def quote_column(col):
+    # Columns such as 'inventory_initial_new&ra_eegsa' need quoting
+    return '"' + str(col).replace('"', '""') + '"'
+
+def _query(query, params=None):
+    # Run query safely on the shared connection pool
+    return read_sql(query, params)
+
+def filter_company_columns(columns, companies):
+    # Keeps company-independent columns and the ones of the selected companies
+    ls_selected = [elem for elem in columns
+                   if company_of(elem) is None or company_of(elem) in companies]
+    return ls_selected
+
+#%% Functions
+
+@cached
+def load_mp_columns(table):
+    # Column names of an MP table, in table order
+    query = """
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name = :table
+        ORDER BY ordinal_position"""
+    df = _query(query, {"table": check_table(table)})
+    return list(df['column_name'])
+
+@cached
+def load_company_schema(table):
+    # Per-company columns of each base metric, resolved once per table
+    return build_company_schema(load_mp_columns(table))
+
+def _load_mp_snapshot(tbl, columns, year_month_range=None, sku=None, dict_rows=None):
+    # Same projection and filters as the SQL path, applied on the Arrow snapshot
+    if sku is not None and dict_rows is not None:
+        # rows of a SKU are contiguous: zero-copy slice instead of a scan
+        int_start, int_length = dict_rows.get(sku, (0, 0))
+        tbl = tbl.slice(int_start, int_length)
+        sku = None
+    expr = None
+    if year_month_range is not None:
+        str_start, str_end = year_month_range
+        if str_start is not None:
+            expr = pc.field('year_month') >= str_start
+        if str_end is not None:
+            expr_end = pc.field('year_month') <= str_end
+            expr = expr_end if expr is None else expr & expr_end
+    if sku is not None:
+        expr_sku = pc.field('sku') == sku
+        expr = expr_sku if expr is None else expr & expr_sku
+    if expr is not None:
+        tbl = tbl.filter(expr)
+    if 'year_month' in columns and (sku is not None or dict_rows is not None):
+        tbl = tbl.sort_by('year_month')
+    # numeric columns without nulls stay views of the memory-mapped file
+    tbl = tbl.select(columns)
+    return tbl.to_pandas(split_blocks=True, categories=text_categories(tbl))
+
+def _load_mp_sql(table, version_list, columns, year_month_range=None, sku=None):
+    str_cols = ', '.join(quote_column(col) for col in columns)
+    query = f"SELECT {str_cols} FROM {check_table(table)} WHERE version = ANY(:versions)"
+    params = {"versions": list(version_list)}
+
+    # Date filter: inclusive 'YYYY-MM' bounds, either of them can be None
+    if year_month_range is not None:
+        str_start, str_end = year_month_range
+        if str_start is not None:
+            query += " AND year_month >= :ym_start"
+            params["ym_start"] = str_start
+        if str_end is not None:
+            query += " AND year_month <= :ym_end"
+            params["ym_end"] = str_end
+
+    # SKU filter: a single SKU is only a few dozen rows
+    if sku is not None:
+        query += " AND sku = :sku"
+        params["sku"] = sku
+        if 'year_month' in columns:
+            query += " ORDER BY year_month"
+    return _query(query, params)
+
+@cached(resource=True, max_entries=MAX_CACHED_VERSIONS)
+def load_mp_table(table, version):
+    # Full version as one memory-mapped Arrow table shared by every session, read-only
+    tbl = read_snapshot(table, version)
+    if tbl is None:
+        # rows ordered by sku so that each SKU is a contiguous slice of the snapshot
+        df = _load_mp_sql(table, [version], load_mp_columns(table))
+        df = df.sort_values(['sku', 'year_month'], kind='stable', ignore_index=True)
+        write_snapshot(table, version, df)
+        tbl = read_snapshot(table, version)
+    return tbl
+
+@cached(resource=True, max_entries=MAX_CACHED_VERSIONS)
+def load_mp_sku_rows(table, version):
+    # (start, length) of the rows of each SKU in the shared table, None if not contiguous
+    tbl = load_mp_table(table, version)
+    arr_sku = tbl.column('sku').combine_chunks().dictionary_encode()
+    npa_codes = arr_sku.indices.to_numpy(zero_copy_only=False)
+    if npa_codes.size == 0:
+        return {}
+    npa_starts = np.r_[0, np.flatnonzero(np.diff(npa_codes)) + 1]
+    if npa_starts.size != len(arr_sku.dictionary):
+        # snapshots written before the rows were ordered by sku
+        return None
+    npa_lengths = np.diff(np.r_[npa_starts, npa_codes.size])
+    ls_skus = arr_sku.dictionary.take(pa.array(npa_codes[npa_starts])).to_pylist()
+    return dict(zip(ls_skus, zip(npa_starts.tolist(), npa_lengths.tolist())))
+
+def _load_mp(table, version_list, columns=None, companies=None, year_month_range=None, sku=None):
+    bool_full = columns is None and companies is None and year_month_range is None and sku is None
+
+    # Column projection: all columns unless a subset is requested
+    if columns is None:
+        columns = load_mp_columns(table)
+    columns = list(columns)
+
+    # Company filter: drops columns that belong to non-selected companies
+    if companies is not None:
+        columns = filter_company_columns(columns, companies)
+
+    # Single versions are served from the shared snapshot table, built on the first full load
+    if len(version_list) == 1 and (bool_full or snapshot_exists(table, version_list[0])):
+        tbl = load_mp_table(table, version_list[0])
+        dict_rows = load_mp_sku_rows(table, version_list[0]) if sku is not None else None
+        df = _load_mp_snapshot(tbl, columns, year_month_range, sku, dict_rows)
+        # numerics are not downcast, that would replace the memory-mapped views with copies
+        return normalize_mp_frame(df, table, bool_downcast=False)
+
+    return normalize_mp_frame(_load_mp_sql(table, version_list, columns, year_month_range, sku), table)
+
+@cached(resource=True, max_entries=MAX_CACHED_FRAMES)
+def load_mp(table, version_list, columns=None, companies=None, year_month_range=None):
+    # Shared by every session and rerun without a copy, callers must not modify it
+    return _load_mp(table, version_list, columns, companies, year_month_range)
+
+@cached
+def load_mp_skus(table, version_list):
+    # Cheap SKU catalog of a version, used to fill SKU selectors
+    query = f"""
+        SELECT DISTINCT ON (sku) sku, sku_description, sku_family
+        FROM {check_table(table)}
+        WHERE version = ANY(:versions)
+        ORDER BY sku"""
+    return _query(query, {"versions": list(version_list)})
+
+@cached
+def load_mp_sku(table, version_list, sku, columns=None):
+    # Rows of a single SKU, cached per (version, sku)
+    return _load_mp(table, version_list, columns, sku=sku)
+
+@cached
+def load_mp_sums(table, version_list, columns, by):
+    # Server-side aggregation: one row per value of `by` with the sum of each column
+    str_sums = ', '.join(f'COALESCE(SUM({quote_column(col)}), 0) AS {quote_column(col)}' for col in columns)
+    query = f"""
+        SELECT {quote_column(by)}, {str_sums}
+        FROM {check_table(table)}
+        WHERE version = ANY(:versions)
+        GROUP BY {quote_column(by)}
+        ORDER BY {quote_column(by)}"""
+    return _query(query, {"versions": list(version_list)})
+
+#%% Portfolio
+
+# metrics added over the SKUs of a family or of the whole version
+PORTFOLIO_METRICS = ['inventory_initial_new&ra',
+                     'inventory_final_new&ra',
+                     'rp_inventory',
+                     'ss_inventory',
+                     'demand_min_stock',
+                     'inventory_purchase',
+                     'inventory_initial_new&ra_valuation',
+                     'inventory_purchase_valuation']
+
+@cached
+def load_portfolio_sums(table, version, family=None, company=None, by='year_month'):
+    # One GROUP BY over the version: per `by`, the sum over SKUs and companies of each metric,
+    # cached per (version, family, company)
+    schema = load_company_schema(table)
+    companies = None if company is None else [company]
+    ls_sums = []
+    for base in PORTFOLIO_METRICS:
+        ls_cols = company_columns(schema, base, companies)
+        # a company without a column of the metric adds nothing to it
+        if not ls_cols:
+            ls_sums.append(f'0 AS {quote_column(base)}')
+            continue
+        str_cols = ' + '.join(f'COALESCE({quote_column(col)}, 0)' for col in ls_cols)
+        ls_sums.append(f'SUM({str_cols}) AS {quote_column(base)}')
+    str_family = " AND sku_family = :family" if family is not None else ''
+    query = f"""
+        SELECT {quote_column(by)}, COUNT(DISTINCT sku) AS n_skus, {', '.join(ls_sums)}
+        FROM {check_table(table)}
+        WHERE version = :version{str_family}
+        GROUP BY {quote_column(by)}
+        ORDER BY {quote_column(by)}"""
+    return _query(query, {"version": version, "family": family})
+
+#%% Paged reads
+
+def _mp_search_sql(str_query):
+    # SKU code prefix or description match, shared by the page and its count
+    if not str_query:
+        return '', {}
+    return (" AND (sku::text LIKE :query_prefix OR sku_description ILIKE :query_any)",
+            {"query_prefix": f'{str_query}%', "query_any": f'%{str_query}%'})
+
+@cached
+def load_mp_count(table, version_list, str_query=None):
+    # Rows matching the search, for the page selector
+    str_where, params = _mp_search_sql(str_query)
+    query = f"SELECT COUNT(*) AS n_rows FROM {check_table(table)} WHERE version = ANY(:versions)" + str_where
+    return int(_query(query, {"versions": list(version_list), **params})['n_rows'].iloc[0])
+
+@cached
+def load_mp_page(table, version_list, columns, int_offset, int_limit, sort_by=None, ascending=True, str_query=None):
+    # One page of rows, filtered and sorted by the database before LIMIT/OFFSET
+    if sort_by is not None and sort_by not in load_mp_columns(table):
+        raise ValueError(f'Unknown MP column: {sort_by!r}')
+    str_where, params = _mp_search_sql(str_query)
+    # sku, year_month as tie-breakers keep the pages stable
+    ls_order = [f"{quote_column(sort_by)} {'ASC' if ascending else 'DESC'}"] if sort_by else []
+    ls_order += ['sku', 'year_month']
+    query = f"""
+        SELECT {', '.join(quote_column(col) for col in columns)}
+        FROM {check_table(table)}
+        WHERE version = ANY(:versions){str_where}
+        ORDER BY {', '.join(ls_order)}
+        LIMIT :limit OFFSET :offset"""
+    params.update({"versions": list(version_list), "limit": int(int_limit), "offset": int(int_offset)})
+    return _query(query, params)
+
+#%% Summaries
+
+# company metrics materialized per (version, year_month, company) in mp_summary_company_month
+SUMMARY_METRICS = {
+    'inventory_initial_new&ra_valuation': 'inventory_valuation',
+    'inventory_purchase_valuation': 'purchase_valuation',
+    'inventory_purchase': 'purchase_qty'
+    }
+
+@cached(ttl="1m")
+def load_summary_versions(table):
+    # Versions whose summaries were refreshed when they were registered
+    df = _query("SELECT to_regclass('mp_summary_versions') IS NOT NULL AS summary_exists")
+    if not df['summary_exists'].iloc[0]:
+        return frozenset()
+    df = _query("SELECT version FROM mp_summary_versions WHERE table_name = :table",
+                {"table": check_table(table)})
+    return frozenset(df['version'])
+
+@cached
+def load_company_sums(table, version_list, base, by):
+    # Sums of a base metric per `by`, one column per company column, same frame as load_mp_sums
+    schema = load_company_schema(table)
+    ls_cols = company_columns(schema, base)
+    if (len(version_list) == 1 and version_list[0] in load_summary_versions(table)
+            and base in SUMMARY_METRICS and by in ('year', 'year_month')):
+        query = f"""
+            SELECT {by}, company, SUM({SUMMARY_METRICS[base]}) AS value
+            FROM mp_summary_company_month
+            WHERE table_name = :table AND version = :version
+            GROUP BY {by}, company
+            ORDER BY {by}"""
+        df = _query(query, {"table": table, "version": version_list[0]})
+        df = df.pivot(index=by, columns='company', values='value').rename(columns=schema[base])
+        df = df.reindex(columns=ls_cols).fillna(0).reset_index()
+        df.columns.name = None
+        return df
+    # versions without summaries are aggregated from the MP table
+    return load_mp_sums(table, version_list, ls_cols, by)
+
+#%% Master data and projects
+
+@cached(ttl="10m")
+def load_data_mm():
+    # Perform query
+    return _query('SELECT * FROM raw_master_data')
+
+@cached(ttl="10m")
+def load_data_projects():
+    # Perform query
+    return _query('SELECT * FROM clean_company_projects')
+
+@cached(ttl="10m")
+def load_data_projects_consumption():
+    # Perform query
+    return _query('SELECT * FROM clean_company_projects_consumption')
+
+#%% Alerts
+
+# purchase types counted as alerts, and the state they raise
+dict_alert_types = {
+    'stock out': 'stockouts',
+    'near miss': 'near miss',
+    'emergency': 'emergency'
+    }
+
+# SKUs that are planned (MRP, MTO or MIN) and not obsolete
+_MM_CLEAN_SQL = """
+    SELECT DISTINCT sap_codigo, sociedad
+    FROM raw_master_data
+    WHERE (mrp = 'si' OR mto = 'si' OR min_stock = 'si') AND obsoleto = 'no'"""
+
+def company_states_sql(table, schema):
+    # counts: alert flags per (sku, company) of the versions, company_states: final state per (sku, company)
+    ls_counts, ls_values = [], []
+    for str_company in COMPANIES:
+        str_col = quote_column(schema['purchase_type'][str_company])
+        ls_flags = []
+        for str_type, str_state in dict_alert_types.items():
+            str_alias = quote_column(f'{str_state}_{str_company}')
+            ls_counts.append(f"(COUNT(*) FILTER (WHERE {str_col} = '{str_type}') > 0)::int AS {str_alias}")
+            ls_flags.append(f'c.{str_alias}')
+        ls_values.append(f"('{str_company}', {', '.join(ls_flags)})")
+
+    str_company_case = state_case_sql('v.stockouts', 'v.near_miss', 'v.emergency')
+    return f"""
+        counts AS (
+            SELECT sku, {', '.join(ls_counts)}
+            FROM {check_table(table)}
+            WHERE version = ANY(:versions)
+            GROUP BY sku
+        ),
+        company_states AS (
+            SELECT c.sku, v.company, v.stockouts, v.near_miss, v.emergency,
+                   {str_company_case} AS final_state
+            FROM counts c
+            CROSS JOIN LATERAL (VALUES {', '.join(ls_values)})
+                AS v(company, stockouts, near_miss, emergency)
+        )"""
+
+def _alerts_cte(table, version_list):
+    # company_states: binary alert flags and final state per (sku, company)
+    # sku_states: overall flags and final state per sku
+    if len(version_list) == 1 and version_list[0] in load_summary_versions(table):
+        # materialized when the version was registered
+        str_company_states = """
+        company_states AS (
+            SELECT sku, company, stockouts, near_miss, emergency, final_state
+            FROM mp_summary_alerts
+            WHERE table_name = :table AND version = ANY(:versions)
+        )"""
+    else:
+        str_company_states = company_states_sql(table, load_company_schema(table))
+
+    str_sku_case = state_case_sql('s.stockouts', 's.near_miss', 's.emergency')
+    return f"""
+        WITH {str_company_states},
+        mm AS (
+            SELECT DISTINCT ON (sap_codigo::text) sap_codigo::text AS sku, sap_descripcion, familia_01
+            FROM raw_master_data
+            ORDER BY sap_codigo::text
+        ),
+        sku_flags AS (
+            SELECT sku,
+                   bool_or(final_state = 'stockouts')::int AS stockouts,
+                   bool_or(final_state = 'near miss')::int AS near_miss,
+                   bool_or(final_state = 'emergency')::int AS emergency
+            FROM company_states
+            GROUP BY sku
+        ),
+        sku_states AS (
+            SELECT s.sku, mm.sap_descripcion AS sku_description, mm.familia_01 AS sku_family,
+                   s.stockouts, s.near_miss, s.emergency,
+                   {str_sku_case} AS final_state
+            FROM sku_flags s
+            LEFT JOIN mm ON mm.sku = s.sku::text
+        )"""
+
+@cached
+def load_alerts_company_states(table, version_list):
+    # Final state per (sku, company), with SKU description and family
+    query = _alerts_cte(table, version_list) + """
+        SELECT c.sku, s.sku_description, s.sku_family, c.company,
+               c.stockouts, c.near_miss AS "near miss", c.emergency, c.final_state
+        FROM company_states c
+        JOIN sku_states s ON s.sku = c.sku
+        ORDER BY c.company, c.sku"""
+    return _query(query, {"table": table, "versions": list(version_list)})
+
+@cached
+def load_alerts_sku_states(table, version_list):
+    # Overall final state per sku over all companies
+    query = _alerts_cte(table, version_list) + """
+        SELECT sku, sku_description, sku_family,
+               stockouts, near_miss AS "near miss", emergency, final_state
+        FROM sku_states
+        ORDER BY sku"""
+    return _query(query, {"table": table, "versions": list(version_list)})
+
+@cached
+def load_alerts_company_summary(table, version_list):
+    # SKUs per company and final state, against the planned SKUs of the material master
+    query = _alerts_cte(table, version_list) + f""",
+        alerts AS (
+            SELECT company,
+                   COUNT(*) FILTER (WHERE final_state = 'stockouts') AS stockouts,
+                   COUNT(*) FILTER (WHERE final_state = 'near miss') AS near_miss,
+                   COUNT(*) FILTER (WHERE final_state = 'emergency') AS emergency
+            FROM company_states
+            GROUP BY company
+        ),
+        skus AS (
+            SELECT lower(sociedad) AS company, COUNT(*) AS total_skus
+            FROM ({_MM_CLEAN_SQL}) mm_clean
+            GROUP BY lower(sociedad)
+        )
+        SELECT COALESCE(a.company, k.company) AS company,
+               a.stockouts, a.near_miss AS "near miss", a.emergency,
+               a.stockouts + a.near_miss + a.emergency AS total,
+               k.total_skus,
+               ROUND(a.stockouts::numeric/k.total_skus, 3)::float AS stockouts_proportion,
+               ROUND(a.near_miss::numeric/k.total_skus, 3)::float AS "near miss_proportion",
+               ROUND(a.emergency::numeric/k.total_skus, 3)::float AS emergency_proportion
+        FROM alerts a
+        FULL OUTER JOIN skus k ON k.company = a.company
+        ORDER BY stockouts_proportion DESC NULLS LAST"""
+    return _query(query, {"table": table, "versions": list(version_list)})
+
+@cached
+def load_alerts_family_summary(table, version_list):
+    # SKUs per family and overall final state
+    query = _alerts_cte(table, version_list) + """
+        SELECT sku_family,
+               COUNT(*) FILTER (WHERE final_state = 'stockouts') AS stockouts,
+               COUNT(*) FILTER (WHERE final_state = 'near miss') AS "near miss",
+               COUNT(*) FILTER (WHERE final_state = 'emergency') AS emergency
+        FROM sku_states
+        WHERE sku_family IS NOT NULL
+        GROUP BY sku_family
+        ORDER BY stockouts DESC"""
+    return _query(query, {"table": table, "versions": list(version_list)})
+
+@cached(ttl="10m")
+def load_master_planned_skus():
+    # Unique planned SKUs of the material master
+    query = f"SELECT COUNT(DISTINCT sap_codigo) AS total_skus FROM ({_MM_CLEAN_SQL}) mm_clean"
+    return int(_query(query)['total_skus'].iloc[0])
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+# Monte Carlo stockout risk of an MP version: demand and lead times are sampled around the stored
+# plan and every path is rolled forward like the purchase simulator
+#
+# usage: python -m utils.montecarlo --version 2025-31 [--table clean_real_mp] [--paths 1000]
+#                                   [--seed 0] [--workers N] [--out risk.parquet]
+
+#%% Importing packages
+
+import argparse
+import multiprocessing.context
+import multiprocessing.spawn
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import cached, instrumented
+from utils.policy import BASE_SERVICE_LEVEL, demand_std
+from utils.simulation import SIMULATION_DTYPE, load_simulation_inputs, roll_forward
+
+#%% Constants
+
+RISK_PATHS = 1000
+RISK_SEED = 0
+
+# processes of the shared pool, runs started together queue their chunks instead of adding processes
+RISK_WORKERS = int(os.environ.get('MP_RISK_WORKERS', min(4, os.cpu_count() or 1)))
+
+# runs kept by the result cache, one per version and assumptions
+RISK_CACHED_RUNS = 4
+
+# SKUs per task sent to the pool, small enough to balance the workers and report progress
+CHUNK_SKUS = 200
+
+# probability from which a SKU month is reported at risk
+RISK_THRESHOLD = 0.05
+
+# one roll forward per SKU, uninstrumented so the workers do not flood the call history
+_roll_forward = roll_forward.__wrapped__
+
+#%% Sampling
+
+def risk_inputs(dict_inputs, flt_base_service_level=BASE_SERVICE_LEVEL):
+    # Per-SKU arrays of the sampler, the demand std is backed out of the stored ss at its service level
+    npa_recurrent = dict_inputs['demand_recurrent']
+    npa_lt = dict_inputs['lead_time'][:, None]
+    npa_lt_std = dict_inputs['lead_time_std'][:, None]
+    # horizon averages per SKU and company, as in the policy engine
+    npa_d = npa_recurrent.mean(axis=1, dtype=float)
+    npa_ss = dict_inputs['ss_inventory'].mean(axis=1, dtype=float)
+    return {'start': dict_inputs['start'],
+            'purchase': dict_inputs['purchase'],
+            'demand_recurrent': npa_recurrent,
+            'demand_other': dict_inputs['demand'] - npa_recurrent,
+            'demand_std': demand_std(npa_ss, npa_d, npa_lt, npa_lt_std,
+                                     flt_base_service_level).astype(SIMULATION_DTYPE),
+            'lead_time_std': dict_inputs['lead_time_std']}
+
+def _sample_sku(rng, int_paths, npa_start, npa_purchase, npa_recurrent, npa_other, npa_std, flt_lt_std):
+    # Final inventory of one SKU on every path, (paths x month x company)
+    int_months, int_companies = npa_purchase.shape
+
+    # demand: normal around the stored recurrent consumption, never negative, plus the deterministic
+    # project and sales demand
+    npa_demand = rng.standard_normal((int_paths, int_months, int_companies), dtype=SIMULATION_DTYPE)
+    npa_demand *= npa_std
+    npa_demand += npa_recurrent
+    np.maximum(npa_demand, 0, out=npa_demand)
+    npa_demand += npa_other
+
+    # lead times: each purchase arrives rint(LT' - LT) months off plan, LT' ~ N(LT, sd_LT);
+    # early arrivals wait for the horizon start and those pushed past the horizon are dropped
+    npa_t, npa_c = np.nonzero(npa_purchase)
+    if flt_lt_std > 0 and len(npa_t):
+        npa_shift = np.rint(rng.standard_normal((int_paths, len(npa_t)))*flt_lt_std).astype(np.int64)
+        npa_arrival = np.maximum(npa_t + npa_shift, 0)
+        npa_in = npa_arrival < int_months
+        npa_flat = (np.arange(int_paths)[:, None]*int_months + npa_arrival)*int_companies + npa_c
+        npa_path_purchase = np.bincount(npa_flat[npa_in],
+                                        weights=np.broadcast_to(npa_purchase[npa_t, npa_c], npa_flat.shape)[npa_in],
+                                        minlength=int_paths*int_months*int_companies)
+        npa_path_purchase = npa_path_purchase.reshape(int_paths, int_months, int_companies)
+    else:
+        npa_path_purchase = npa_purchase[None]
+
+    return _roll_forward(np.broadcast_to(npa_start, (int_paths, int_companies)), npa_path_purchase, npa_demand)
+
+def _risk_chunk(int_first, dict_chunk, int_paths, int_seed):
+    # Stockout probability of a chunk of SKUs, per company and for any company,
+    # each SKU has its own stream so the result does not depend on the chunks or the workers
+    int_skus, int_months, int_companies = dict_chunk['purchase'].shape
+    npa_prob = np.zeros((int_skus, int_months, int_companies), dtype=SIMULATION_DTYPE)
+    npa_prob_any = np.zeros((int_skus, int_months), dtype=SIMULATION_DTYPE)
+    for i in range(int_skus):
+        flt_lt_std = float(dict_chunk['lead_time_std'][i])
+        bool_random = dict_chunk['demand_std'][i].any() or (flt_lt_std > 0 and dict_chunk['purchase'][i].any())
+        # a SKU without any variability has a single path
+        rng = np.random.default_rng([int_seed, int_first + i])
+        npa_stockout = _sample_sku(rng, int_paths if bool_random else 1,
+                                   dict_chunk['start'][i],
+                                   dict_chunk['purchase'][i],
+                                   dict_chunk['demand_recurrent'][i],
+                                   dict_chunk['demand_other'][i],
+                                   dict_chunk['demand_std'][i],
+                                   flt_lt_std) < 0
+        npa_prob[i] = npa_stockout.mean(axis=0)
+        npa_prob_any[i] = npa_stockout.any(axis=2).mean(axis=0)
+    return int_first, npa_prob, npa_prob_any
+
+# processes of the risk pool, told apart by name when their start-up data is written
+_RISK_PROCESS_PREFIX = 'mp-risk-'
+
+_get_preparation_data = multiprocessing.spawn.get_preparation_data
+
+def _preparation_data(name):
+    # streamlit runs each page as a __main__ module without spec, a spawned worker would import
+    # and run the page again: the workers of the risk pool only import utils.montecarlo,
+    # other processes and the __main__ module itself are left as they are
+    dict_data = _get_preparation_data(name)
+    if name.startswith(_RISK_PROCESS_PREFIX):
+        dict_data.pop('init_main_from_path', None)
+    return dict_data
+
+multiprocessing.spawn.get_preparation_data = _preparation_data
+
+class _RiskProcess(multiprocessing.context.SpawnProcess):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = _RISK_PROCESS_PREFIX + self.name
+
+class _RiskContext(multiprocessing.context.SpawnContext):
+    Process = _RiskProcess
+
+def make_risk_pool(int_workers):
+    # spawned workers do not inherit the server threads nor its open connections
+    return ProcessPoolExecutor(int_workers, mp_context=_RiskContext())
+
+@st.cache_resource
+def get_risk_pool():
+    # One pool per server process, started once and shared by every run
+    return make_risk_pool(RISK_WORKERS)
+
+@instrumented
+def estimate_stockout_risk(dict_inputs, int_paths=RISK_PATHS, int_seed=RISK_SEED,
+                           flt_base_service_level=BASE_SERVICE_LEVEL, executor=None, progress=None):
+    # Stockout probability per SKU, month and company over `int_paths` sampled paths,
+    # SKU chunks spread across `executor` (in this process without one),
+    # `progress(done, total)` is called as chunks finish
+    dict_risk = risk_inputs(dict_inputs, flt_base_service_level)
+    int_skus, int_months, int_companies = dict_risk['purchase'].shape
+    npa_prob = np.zeros((int_skus, int_months, int_companies), dtype=SIMULATION_DTYPE)
+    npa_prob_any = np.zeros((int_skus, int_months), dtype=SIMULATION_DTYPE)
+
+    ls_chunks = [(int_first, {key: npa[int_first:int_first + CHUNK_SKUS] for key, npa in dict_risk.items()})
+                 for int_first in range(0, int_skus, CHUNK_SKUS)]
+    int_done = 0
+
+    def collect(int_first, npa_chunk, npa_chunk_any):
+        nonlocal int_done
+        npa_prob[int_first:int_first + len(npa_chunk)] = npa_chunk
+        npa_prob_any[int_first:int_first + len(npa_chunk)] = npa_chunk_any
+        int_done += len(npa_chunk)
+        if progress is not None:
+            progress(int_done, int_skus)
+
+    if executor is None:
+        for int_first, dict_chunk in ls_chunks:
+            collect(*_risk_chunk(int_first, dict_chunk, int_paths, int_seed))
+    else:
+        ls_futures = [executor.submit(_risk_chunk, int_first, dict_chunk, int_paths, int_seed)
+                      for int_first, dict_chunk in ls_chunks]
+        for future in as_completed(ls_futures):
+            collect(*future.result())
+    return {'prob': npa_prob, 'prob_any': npa_prob_any}
+
+@cached(resource=True, show_spinner=False, max_entries=RISK_CACHED_RUNS)
+def load_stockout_risk(table, version, int_paths=RISK_PATHS, int_seed=RISK_SEED,
+                       flt_base_service_level=BASE_SERVICE_LEVEL):
+    # Stockout probabilities of a version, computed once per assumptions and shared read-only
+    executor = get_risk_pool() if RISK_WORKERS > 1 else None
+    try:
+        dict_result = estimate_stockout_risk(load_simulation_inputs(table, version), int_paths, int_seed,
+                                             flt_base_service_level, executor)
+    except BrokenProcessPool:
+        # a worker died (out of memory): the broken pool is shut down and the next run starts a new one
+        executor.shutdown(wait=False, cancel_futures=True)
+        get_risk_pool.clear()
+        raise
+    for npa in dict_result.values():
+        npa.flags.writeable = False
+    return dict_result
+
+#%% Summaries
+
+@instrumented
+def summarize_risk(dict_inputs, dict_result, company=None, flt_threshold=RISK_THRESHOLD):
+    # Expected SKUs in stockout and SKUs at risk per month, and the risk of each SKU,
+    # for one company or for any company
+    if company is None:
+        npa_prob = dict_result['prob_any']
+    else:
+        npa_prob = dict_result['prob'][:, :, dict_inputs['companies'].index(company)]
+    npa_risk = npa_prob >= flt_threshold
+
+    df_months = pd.DataFrame({'expected_skus_in_stockout': npa_prob.sum(axis=0, dtype=float),
+                              'skus_at_risk': npa_risk.sum(axis=0)},
+                             index=pd.Index(dict_inputs['months'], name='year_month'))
+
+    npa_first = npa_risk.argmax(axis=1)
+    df_skus = pd.DataFrame({'sku_family': dict_inputs['sku_family'],
+                            'max_stockout_probability': npa_prob.max(axis=1),
+                            'mean_stockout_probability': npa_prob.mean(axis=1, dtype=float),
+                            'months_at_risk': npa_risk.sum(axis=1),
+                            'first_month_at_risk': np.where(npa_risk[np.arange(len(npa_first)), npa_first],
+                                                            dict_inputs['months'][npa_first], '')},
+                           index=pd.Index(dict_inputs['skus'], name='sku'))
+    return df_months, df_skus
+
+def risk_frame(dict_inputs, dict_result):
+    # Long frame of the probabilities, one row per SKU, month and company
+    int_skus, int_months, int_companies = dict_result['prob'].shape
+    return pd.DataFrame({'sku': np.repeat(dict_inputs['skus'], int_months*int_companies),
+                         'year_month': np.tile(np.repeat(dict_inputs['months'], int_companies), int_skus),
+                         'company': np.tile(dict_inputs['companies'], int_skus*int_months),
+                         'stockout_probability': dict_result['prob'].ravel()})
+
+#%% Main
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo stockout probability of an MP version')
+    parser.add_argument('--table', default='clean_real_mp')
+    parser.add_argument('--version', required=True)
+    parser.add_argument('--paths', type=int, default=RISK_PATHS)
+    parser.add_argument('--seed', type=int, default=RISK_SEED)
+    parser.add_argument('--base-service-level', type=float, default=BASE_SERVICE_LEVEL)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processes, all cores by default')
+    parser.add_argument('--out', help='csv or parquet file to store the probabilities')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    dict_inputs = load_simulation_inputs(args.table, args.version)
+    t1 = time.perf_counter()
+
+    def progress(int_done, int_total):
+        print(f'\r{int_done}/{int_total} SKUs', end='', flush=True)
+
+    if args.workers > 1:
+        with make_risk_pool(args.workers) as executor:
+            dict_result = estimate_stockout_risk(dict_inputs, args.paths, args.seed, args.base_service_level,
+                                                 executor, progress)
+    else:
+        dict_result = estimate_stockout_risk(dict_inputs, args.paths, args.seed, args.base_service_level,
+                                             progress=progress)
+    t2 = time.perf_counter()
+    print(f'\nloaded in {t1 - t0:.1f} s, {len(dict_inputs["skus"])} SKUs x {args.paths} paths sampled in {t2 - t1:.1f} s')
+
+    df_months, df_skus = summarize_risk(dict_inputs, dict_result)
+    print(df_months.to_string())
+    print(df_skus.sort_values('max_stockout_probability', ascending=False).head(20).to_string())
+
+    if args.out:
+        df = risk_frame(dict_inputs, dict_result)
+        if args.out.endswith('.parquet'):
+            df.to_parquet(args.out, index=False)
+        else:
+            df.to_csv(args.out, index=False)
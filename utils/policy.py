@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import cached, instrumented
+from utils.loaders import load_company_schema, load_mp
+from utils.schema import COMPANIES
+
+#%% Constants
+
+# service level the stored ss columns were computed with
+BASE_SERVICE_LEVEL = 0.95
+
+# dtype of the (rows x companies) terms: half the memory traffic of float64, the results are
+# aggregated in float64
+POLICY_DTYPE = np.float32
+
+# versions kept by the shared input cache, each one holds several arrays of the size of a version
+POLICY_CACHED_VERSIONS = 2
+
+# per-company metrics read by the engine
+POLICY_METRICS = ['demand_recurrent_consumption',
+                  'ss_inventory',
+                  'rp_inventory',
+                  'inventory_initial_new&ra',
+                  'inventory_initial_new&ra_valuation',
+                  'inventory_purchase',
+                  'inventory_purchase_valuation']
+
+KEYS = ['sku', 'year_month']
+
+#%% Functions
+
+def service_z(flt_service_level):
+    # z of a one-sided normal service level, 0.95 -> 1.645
+    return NormalDist().inv_cdf(flt_service_level)
+
+def lead_time_demand_variance(npa_ss_squared, npa_d_lt_var, flt_base_service_level=BASE_SERVICE_LEVEL):
+    # The MP does not store the demand std: LT*sd^2 is backed out of the stored ss,
+    # (ss/z)^2 = LT*sd^2 + d^2*sd_LT^2, and never negative
+    npa_var = npa_ss_squared/service_z(flt_base_service_level)**2
+    npa_var -= npa_d_lt_var
+    np.maximum(npa_var, 0, out=npa_var)
+    return npa_var
+
+def demand_std(npa_ss, npa_d, npa_lt, npa_lt_std, flt_base_service_level=BASE_SERVICE_LEVEL):
+    # Monthly demand deviation of a stored ss, a SKU without lead time counts one month
+    # so that LT*sd^2 is kept whole, as compute_policy does
+    npa_var = lead_time_demand_variance(npa_ss**2, npa_d**2*npa_lt_std**2, flt_base_service_level)
+    npa_var /= np.where(npa_lt > 0, npa_lt, 1)
+    return np.sqrt(npa_var)
+
+def unit_prices(npa_qty, npa_valuation, npa_purchase, npa_purchase_valuation, npa_sku_codes):
+    # GTQ per unit of each (row, company), from the inventory or purchase valuation of any month of the SKU
+    npa_price = np.full(npa_qty.shape, np.nan)
+    np.divide(npa_valuation, npa_qty, out=npa_price, where=npa_qty > 0)
+    npa_missing = np.isnan(npa_price) & (npa_purchase > 0)
+    npa_price[npa_missing] = npa_purchase_valuation[npa_missing]/npa_purchase[npa_missing]
+    # the same price for every month of a SKU, 0 when it was never valued
+    df_price = pd.DataFrame(npa_price).groupby(npa_sku_codes, sort=False).transform('max')
+    return np.nan_to_num(df_price.to_numpy())
+
+def _group_sums(npa_codes, int_groups, npa_values):
+    # Sum of each column per group code, one bincount per column
+    return np.column_stack([np.bincount(npa_codes, weights=npa_values[:, j], minlength=int_groups)
+                            for j in range(npa_values.shape[1])])
+
+def _sku_means(dict_inputs, npa_values):
+    # Horizon average per SKU of a (rows x companies) array, all companies added
+    # the company sum as a product with ones is one BLAS pass instead of a strided reduction
+    npa_total = npa_values @ np.ones(npa_values.shape[1], dtype=npa_values.dtype)
+    return np.bincount(dict_inputs['sku_codes'], weights=npa_total,
+                       minlength=len(dict_inputs['skus']))/dict_inputs['sku_rows']
+
+@cached(resource=True, max_entries=POLICY_CACHED_VERSIONS)
+def load_policy_inputs(table, version):
+    # (rows x companies) terms of a whole version that do not depend on the assumptions,
+    # built once and shared read-only
+    schema = load_company_schema(table)
+    ls_companies = [company for company in COMPANIES
+                    if all(company in schema[base] for base in POLICY_METRICS)]
+    ls_cols = KEYS + ['sku_family', 'lead_time_e_months', 'lead_time_std_months']
+    ls_cols += [schema[base][company] for base in POLICY_METRICS for company in ls_companies]
+    df = load_mp(table, [version], columns=ls_cols)
+
+    dict_mp = {base: np.nan_to_num(df[[schema[base][company] for company in ls_companies]].to_numpy(dtype=float))
+               for base in POLICY_METRICS}
+    npa_sku_codes, npa_skus = pd.factorize(df['sku'])
+    npa_month_codes, npa_months = pd.factorize(df['year_month'], sort=True)
+    npa_lt = np.nan_to_num(df['lead_time_e_months'].to_numpy(dtype=float))[:, None]
+    npa_lt_std = np.nan_to_num(df['lead_time_std_months'].to_numpy(dtype=float))[:, None]
+
+    # expected demand: the recurrent consumption averaged over the horizon of each SKU
+    npa_d = pd.DataFrame(dict_mp['demand_recurrent_consumption']).groupby(
+        npa_sku_codes, sort=False).transform('mean').to_numpy()
+    # SKUs without ss nor rp (MTO, MIN) are not planned by this policy, all their terms are 0
+    npa_planned = (dict_mp['ss_inventory'] > 0) | (dict_mp['rp_inventory'] > 0)
+
+    npa_price = unit_prices(dict_mp['inventory_initial_new&ra'],
+                            dict_mp['inventory_initial_new&ra_valuation'],
+                            dict_mp['inventory_purchase'],
+                            dict_mp['inventory_purchase_valuation'],
+                            npa_sku_codes)
+    dict_inputs = {
+        'companies': ls_companies,
+        'skus': np.asarray(npa_skus),
+        'sku_codes': npa_sku_codes,
+        'sku_rows': np.maximum(np.bincount(npa_sku_codes, minlength=len(npa_skus)), 1),
+        # family of the first row of each SKU
+        'sku_family': df['sku_family'].to_numpy(dtype=object)[np.unique(npa_sku_codes, return_index=True)[1]],
+        'months': np.asarray(npa_months, dtype=str),
+        'month_codes': npa_month_codes,
+        'price': npa_price.astype(POLICY_DTYPE),
+        'ss_inventory': dict_mp['ss_inventory'].astype(POLICY_DTYPE),
+        # ss^2 = z^2*(LT*sd^2 + d^2*sd_LT^2), both terms per row and company
+        'ss_squared': (dict_mp['ss_inventory']**2).astype(POLICY_DTYPE),
+        'demand_lt_variance': np.where(npa_planned, npa_d**2*npa_lt_std**2, 0).astype(POLICY_DTYPE),
+        'demand_lt': np.where(npa_planned, npa_d*npa_lt, 0).astype(POLICY_DTYPE)
+        }
+    dict_inputs.update({
+        'ss_valuation_months': _group_sums(npa_month_codes, len(npa_months), dict_mp['ss_inventory']*npa_price).sum(axis=1),
+        'ss_inventory_skus': _sku_means(dict_inputs, dict_mp['ss_inventory']),
+        'rp_inventory_skus': _sku_means(dict_inputs, dict_mp['rp_inventory'])
+        })
+    for npa in dict_inputs.values():
+        if isinstance(npa, np.ndarray):
+            npa.flags.writeable = False
+    return dict_inputs
+
+@instrumented
+def compute_policy(dict_inputs, flt_service_level, flt_base_service_level=BASE_SERVICE_LEVEL,
+                   flt_lead_time_factor=1.0, flt_lead_time_std_factor=1.0):
+    # ss = z*sqrt(LT*sd^2 + d^2*sd_LT^2), rp = d*LT + ss for every row and company in one broadcast
+    npa_d_lt_var = dict_inputs['demand_lt_variance']
+    npa_ss = lead_time_demand_variance(dict_inputs['ss_squared'], npa_d_lt_var, flt_base_service_level)
+
+    # what-if lead times, the demand variance is kept
+    npa_ss *= flt_lead_time_factor
+    npa_ss += npa_d_lt_var*flt_lead_time_std_factor**2
+    np.sqrt(npa_ss, out=npa_ss)
+    npa_ss *= service_z(flt_service_level)
+
+    npa_rp = dict_inputs['demand_lt']*flt_lead_time_factor
+    npa_rp += npa_ss
+    npa_delta = npa_ss - dict_inputs['ss_inventory']
+    npa_delta *= dict_inputs['price']
+    return {'ss_inventory': npa_ss,
+            'rp_inventory': npa_rp,
+            'ss_valuation_delta': npa_delta}
+
+@instrumented
+def summarize_policy(dict_inputs, dict_policy):
+    # Safety stock valuation per month (base, what-if and delta per company) and per SKU
+    npa_months = dict_inputs['months']
+    npa_base = dict_inputs['ss_valuation_months']
+    npa_delta = _group_sums(dict_inputs['month_codes'], len(npa_months), dict_policy['ss_valuation_delta'])
+    df_months = pd.DataFrame(npa_delta, index=pd.Index(npa_months, name='year_month'),
+                             columns=[f'{company}_delta' for company in dict_inputs['companies']])
+    df_months.insert(0, 'ss_valuation', npa_base)
+    df_months.insert(1, 'ss_valuation_whatif', npa_base + npa_delta.sum(axis=1))
+
+    # SKU averages over the horizon, all companies added
+    df_skus = pd.DataFrame({'sku_family': dict_inputs['sku_family'],
+                            'ss_inventory': dict_inputs['ss_inventory_skus'],
+                            'ss_inventory_whatif': _sku_means(dict_inputs, dict_policy['ss_inventory']),
+                            'rp_inventory': dict_inputs['rp_inventory_skus'],
+                            'rp_inventory_whatif': _sku_means(dict_inputs, dict_policy['rp_inventory']),
+                            'ss_valuation_delta': _sku_means(dict_inputs, dict_policy['ss_valuation_delta'])},
+                           index=pd.Index(dict_inputs['skus'], name='sku'))
+    return df_months, df_skus
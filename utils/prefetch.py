@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import logging
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import streamlit as st
+import pandas as pd
+
+from utils.catalog import get_versions_mp
+from utils.loaders import load_data_mm, load_master_planned_skus, load_mp_table
+from utils.projects import load_projects_engine
+
+#%% Constants
+
+# newest versions of the selected MP table warmed in the background
+PREFETCH_VERSIONS = int(os.environ.get('MP_PREFETCH_VERSIONS', '1'))
+
+# background loads running at once, each one holds a pooled connection while it queries:
+# one by default so that user queries keep the rest of the pool
+PREFETCH_WORKERS = int(os.environ.get('MP_PREFETCH_WORKERS', '1'))
+
+# MP table warmed from the landing page, the one most pages read
+PREFETCH_TABLE = 'clean_real_mp'
+
+# seconds before a finished warm-up is queued again, the reruns of a page do not resubmit it
+PREFETCH_INTERVAL = 60
+
+_logger = logging.getLogger(__name__)
+
+#%% Registry
+
+# last run of each warm-up task, shared by all sessions
+_lock = threading.Lock()
+_tasks = {}
+
+def _run(key, func, args):
+    # Fills the shared cache, errors are logged, kept for the diagnostics page and raised again by the page that needs the data
+    with _lock:
+        _tasks[key].update(state='running', started=datetime.now())
+    t0 = time.perf_counter()
+    try:
+        func(*args)
+        str_state, str_error = 'done', None
+    except Exception as exc:
+        str_state, str_error = 'failed', ''.join(traceback.format_exception_only(exc)).strip()
+        _logger.warning('Prefetch of %s failed', ' '.join(map(str, key)), exc_info=True)
+    with _lock:
+        _tasks[key].update(state=str_state, seconds=time.perf_counter() - t0, error=str_error)
+
+def prefetch_stats():
+    with _lock:
+        return pd.DataFrame([{'task': ' '.join(map(str, key)), **dict_task} for key, dict_task in _tasks.items()],
+                            columns=['task', 'state', 'submitted', 'started', 'seconds', 'error'])
+
+#%% Functions
+
+@st.cache_resource
+def get_prefetch_pool():
+    # One background pool per server process
+    return ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix='prefetch')
+
+def submit(key, func, *args):
+    # Queues a cached loader unless the same one is queued, running or just finished,
+    # loads that are already cached return right away
+    with _lock:
+        dict_task = _tasks.get(key, {})
+        if dict_task.get('state') in ('queued', 'running'):
+            return
+        if dict_task.get('state') == 'done' and (datetime.now() - dict_task['submitted']).total_seconds() < PREFETCH_INTERVAL:
+            return
+        _tasks[key] = {'state': 'queued', 'submitted': datetime.now(), 'started': None, 'seconds': None, 'error': None}
+    get_prefetch_pool().submit(_run, key, func, args)
+
+def _prefetch_mp(table, version=None):
+    # Newest versions, and the one before the selected version, the usual next choice
+    ls_versions = list(get_versions_mp(table)['version'])
+    ls_prefetch = ls_versions[:PREFETCH_VERSIONS]
+    if version in ls_versions and ls_versions.index(version) + 1 < len(ls_versions):
+        ls_prefetch.append(ls_versions[ls_versions.index(version) + 1])
+    for str_version in ls_prefetch:
+        submit(('load_mp_table', table, str_version), load_mp_table, table, str_version)
+
+def prefetch(table=PREFETCH_TABLE, version=None):
+    # Warms the likely next loads of a session: the versions of the selected table around the
+    # selected one, the master data and the project tables
+    submit(('versions', table, version), _prefetch_mp, table, version)
+    # read by the Material Master, Alerts and Projects pages
+    submit(('load_data_mm',), load_data_mm)
+    submit(('load_master_planned_skus',), load_master_planned_skus)
+    submit(('load_projects_engine',), load_projects_engine)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import cached, instrumented
+from utils.loaders import load_data_mm, load_data_projects, load_data_projects_consumption
+
+#%% Constants
+
+# final column order of the plan + real project frame
+PROJECT_COLUMNS = ['project_version',
+                   'version_int',
+                   'project_description',
+                   'pep_project',
+                   'company',
+                   'sku',
+                   'sku_description',
+                   'qty',
+                   'year_month',
+                   'year',
+                   'val_type',
+                   'center',
+                   'warehouse',
+                   'material_document',
+                   'type']
+
+# repeated text columns stored as categoricals
+CATEGORICAL_COLUMNS = ['project_version', 'project_description', 'pep_project',
+                       'company', 'sku', 'sku_description', 'type']
+
+# columns with a prebuilt row index for searches
+INDEX_COLUMNS = ['project_version', 'project_description', 'sku', 'sku_description']
+
+#%% Functions
+
+@instrumented
+def build_projects_frame(df_projects, df_projects_consumption, df_mm):
+    # project master data, the last row of each project version wins
+    df_meta= df_projects[['project_version',
+                          'project_description',
+                          'version_int',
+                          'pep',
+                          'company']].drop_duplicates('project_version', keep='last')
+    df_meta= df_meta.rename(columns={'pep': 'pep_project'})
+
+    # sku descriptions, the last row of each sku wins
+    df_sku= df_mm[['sap_codigo', 'sap_descripcion']].drop_duplicates('sap_codigo', keep='last')
+    df_sku= df_sku.rename(columns={'sap_codigo': 'sku', 'sap_descripcion': 'sku_description'})
+
+    # project plan
+    df_plan= df_projects[['project_version', 'sku', 'year_month', 'qty']].copy()
+    df_plan['sku_description']= df_plan['sku'].map(df_sku.set_index('sku')['sku_description'])
+    df_plan['year']= df_plan['year_month'].str[0:4]
+    df_plan['type']= 'plan'
+
+    # project consumption
+    df_real= df_projects_consumption[['project_version',
+                                      'sku',
+                                      'sku_description',
+                                      'val_type',
+                                      'center',
+                                      'warehouse',
+                                      'year',
+                                      'year_month',
+                                      'qty',
+                                      'material_document']].copy()
+    df_real['type']= 'real'
+
+    # project attributes come from the project master data for plan and real rows
+    df= pd.concat([df_plan, df_real], axis=0, ignore_index=True)
+    df= df.merge(df_meta, on='project_version', how='left')
+    df= df.reindex(columns=PROJECT_COLUMNS)
+
+    for str_col in CATEGORICAL_COLUMNS:
+        df[str_col]= df[str_col].astype('category')
+    return df
+
+def build_row_index(df, str_col):
+    # {value: row positions}, positions in frame order
+    return df.groupby(str_col, observed=True, sort=False).indices
+
+def selector_options(df, str_left, str_right):
+    # 'left~right' labels in order of first appearance
+    npa_labels= df[str_left].astype(object) + '~' + df[str_right].astype(object)
+    return list(pd.unique(npa_labels))
+
+@cached(resource=True, ttl="10m")
+def load_projects_engine():
+    # Shared read-only project frame, its row indexes and the selector options
+    df= build_projects_frame(load_data_projects(),
+                             load_data_projects_consumption(),
+                             load_data_mm())
+    return {
+        'frame': df,
+        'indexes': {str_col: build_row_index(df, str_col) for str_col in INDEX_COLUMNS},
+        'project_options': selector_options(df, 'project_version', 'project_description'),
+        'sku_options': selector_options(df, 'sku', 'sku_description')
+        }
+
+def lookup_rows(engine, ls_conditions):
+    # Rows matching any (column, value) condition, through the row indexes
+    ls_positions= [engine['indexes'][str_col].get(value, np.array([], dtype=np.intp))
+                   for str_col, value in ls_conditions]
+    npa_positions= np.unique(np.concatenate(ls_positions))
+    return engine['frame'].iloc[npa_positions]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import re
+
+import pandas as pd
+
+from utils.instrumentation import instrumented
+
+#%% Constants
+
+# companies whose metrics are stored as suffixed columns in the MP tables
+COMPANIES = ['eegsa', 'trelec', 'amesa', 'energica']
+
+#%% Functions
+
+def company_of(col):
+    # Company named in a column, None for company-independent columns
+    for company in COMPANIES:
+        if company in col:
+            return company
+    return None
+
+def base_of(col, company):
+    # Metric name without the company, wherever it is placed:
+    # 'inventory_purchase_eegsa_valuation' -> 'inventory_purchase_valuation'
+    return re.sub(rf'[_&]?{company}', '', col).rstrip('_')
+
+def build_company_schema(columns):
+    # {base metric: {company: column}} for every company-suffixed column
+    dict_schema = {}
+    for col in columns:
+        company = company_of(col)
+        if company is None or 'year' in col or 'sku' in col:
+            continue
+        dict_schema.setdefault(base_of(col, company), {})[company] = col
+    return dict_schema
+
+def company_columns(schema, base, companies=None):
+    # Columns of a base metric for the selected companies, in COMPANIES order
+    if companies is None:
+        companies = COMPANIES
+    dict_cols = schema[base]
+    return [dict_cols[company] for company in COMPANIES
+            if company in companies and company in dict_cols]
+
+@instrumented
+def sum_company_metrics(data, schema, companies=None):
+    # One column per base metric with the sum over the selected companies
+    dict_sums = {}
+    for base in schema:
+        ls_cols = company_columns(schema, base, companies)
+        if not ls_cols:
+            continue
+        try:
+            dict_sums[base] = data[ls_cols].sum(axis=1)
+        except TypeError:
+            # text metrics (e.g. purchase_type) with missing values cannot be added
+            pass
+    return pd.DataFrame(dict_sums, index=data.index)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import cached, instrumented
+from utils.loaders import load_company_schema, load_mp
+from utils.schema import COMPANIES
+
+#%% Constants
+
+# dtype of the (SKU x month x company) arrays, quantities are exact up to 2^24
+SIMULATION_DTYPE = np.float32
+
+# versions kept by the shared input and base caches, each one holds several (SKU x month x company) arrays
+SIMULATION_CACHED_VERSIONS = 2
+
+# demand consumed every month, min stock is a level and not a consumption
+DEMAND_METRICS = ['demand_recurrent_consumption',
+                  'demand_project_consumption',
+                  'demand_sales']
+
+# per-company metrics read by the simulator
+SIMULATION_METRICS = DEMAND_METRICS + ['inventory_initial_new&ra',
+                                       'inventory_final_new&ra',
+                                       'inventory_purchase',
+                                       'ss_inventory',
+                                       'rp_inventory',
+                                       'demand_min_stock',
+                                       'inventory_initial_new&ra_valuation',
+                                       'inventory_purchase_valuation']
+
+# thresholds flagged on the final inventory of each month
+FLAGS = ['stockout', 'below_ss', 'below_rp', 'below_min']
+
+KEYS = ['sku', 'year_month']
+
+#%% Inputs
+
+def to_grid(npa_values, npa_sku_codes, npa_month_codes, int_skus, int_months):
+    # (rows x companies) -> (SKU x month x company), months without a row are 0
+    npa_grid = np.zeros((int_skus, int_months, npa_values.shape[1]), dtype=SIMULATION_DTYPE)
+    npa_grid[npa_sku_codes, npa_month_codes] = npa_values
+    return npa_grid
+
+@cached(resource=True, max_entries=SIMULATION_CACHED_VERSIONS)
+def load_simulation_inputs(table, version):
+    # Whole version as (SKU x month x company) arrays, built once and shared read-only
+    schema = load_company_schema(table)
+    ls_companies = [company for company in COMPANIES
+                    if all(company in schema[base] for base in SIMULATION_METRICS)]
+    ls_cols = KEYS + ['sku_family', 'lead_time_e_months', 'lead_time_std_months']
+    ls_cols += [schema[base][company] for base in SIMULATION_METRICS for company in ls_companies]
+    df = load_mp(table, [version], columns=ls_cols)
+
+    npa_sku_codes, npa_skus = pd.factorize(df['sku'])
+    npa_month_codes, npa_months = pd.factorize(df['year_month'], sort=True)
+    int_skus, int_months = len(npa_skus), len(npa_months)
+
+    def grid(base):
+        npa_values = np.nan_to_num(df[[schema[base][company] for company in ls_companies]].to_numpy(dtype=float))
+        return to_grid(npa_values, npa_sku_codes, npa_month_codes, int_skus, int_months)
+
+    npa_recurrent = grid(DEMAND_METRICS[0])
+    npa_demand = npa_recurrent.copy()
+    for base in DEMAND_METRICS[1:]:
+        npa_demand += grid(base)
+
+    # row of the earliest month of each SKU, the rows of a full version come in no set order
+    npa_order = np.lexsort((npa_month_codes, npa_sku_codes))
+    npa_first = npa_order[np.searchsorted(npa_sku_codes[npa_order], np.arange(int_skus))]
+
+    # stock at the start of the horizon: initial inventory of the earliest month of each SKU
+    npa_initial = grid('inventory_initial_new&ra')
+    npa_start = npa_initial[np.arange(int_skus), npa_month_codes[npa_first]]
+
+    # GTQ per unit, from any valued month of the SKU
+    npa_valuation = grid('inventory_initial_new&ra_valuation') + grid('inventory_purchase_valuation')
+    npa_qty = npa_initial + grid('inventory_purchase')
+    npa_price = np.divide(npa_valuation.sum(axis=1), npa_qty.sum(axis=1),
+                          out=np.zeros((int_skus, len(ls_companies)), dtype=SIMULATION_DTYPE),
+                          where=npa_qty.sum(axis=1) > 0)
+
+    dict_inputs = {
+        'companies': ls_companies,
+        'skus': np.asarray(npa_skus),
+        'sku_family': df['sku_family'].to_numpy(dtype=object)[npa_first],
+        'months': np.asarray(npa_months, dtype=str),
+        'start': npa_start,
+        'price': npa_price,
+        'demand': npa_demand,
+        'demand_recurrent': npa_recurrent,
+        # lead times per SKU, from the row of its earliest month
+        'lead_time': np.nan_to_num(df['lead_time_e_months'].to_numpy(dtype=float))[npa_first],
+        'lead_time_std': np.nan_to_num(df['lead_time_std_months'].to_numpy(dtype=float))[npa_first],
+        'purchase': grid('inventory_purchase'),
+        'final': grid('inventory_final_new&ra'),
+        'ss_inventory': grid('ss_inventory'),
+        'rp_inventory': grid('rp_inventory'),
+        'demand_min_stock': grid('demand_min_stock')
+        }
+    for npa in dict_inputs.values():
+        if isinstance(npa, np.ndarray):
+            npa.flags.writeable = False
+    return dict_inputs
+
+#%% Purchase plan edits
+
+def defer_purchases(npa_purchase, int_months, str_from_month=None, npa_months=None, npa_skus_mask=None):
+    # Purchases from `str_from_month` on arrive `int_months` later, those pushed past the horizon are dropped
+    npa_new = np.array(npa_purchase)
+    if int_months <= 0:
+        return npa_new
+    int_from = 0 if str_from_month is None else int(np.searchsorted(npa_months, str_from_month))
+    npa_rows = slice(None) if npa_skus_mask is None else np.flatnonzero(npa_skus_mask)
+
+    npa_moved = npa_new[npa_rows, int_from:].copy()
+    npa_new[npa_rows, int_from:] = 0
+    npa_new[npa_rows, int_from + int_months:] += npa_moved[:, :max(npa_moved.shape[1] - int_months, 0)]
+    return npa_new
+
+def scale_purchases(npa_purchase, flt_factor, npa_skus_mask=None):
+    # All purchases of the selected SKUs times a factor
+    npa_new = np.array(npa_purchase)
+    if npa_skus_mask is None:
+        npa_new *= flt_factor
+    else:
+        npa_new[npa_skus_mask] *= flt_factor
+    return npa_new
+
+#%% Simulation
+
+@instrumented
+def roll_forward(npa_start, npa_purchase, npa_demand):
+    # Final inventory of every SKU, month and company at once:
+    # final_t = initial_t + purchase_t - demand_t and initial_t+1 = max(final_t, 0),
+    # the stock clipped at zero is the cumulative sum minus its running minimum below zero
+    npa_net = np.subtract(npa_purchase, npa_demand, dtype=SIMULATION_DTYPE)
+    npa_stock = np.cumsum(npa_net, axis=1)
+    npa_stock += npa_start[:, None, :]
+    npa_floor = np.minimum(npa_stock, 0)
+    np.minimum.accumulate(npa_floor, axis=1, out=npa_floor)
+    npa_stock -= npa_floor
+
+    # the initial inventory of a month is the clipped stock at the end of the month before
+    npa_final = npa_net
+    npa_final[:, 0] += npa_start
+    npa_final[:, 1:] += npa_stock[:, :-1]
+    return npa_final
+
+def flag_months(dict_inputs, npa_final):
+    # (SKU x month x company) masks of the months ending below each threshold
+    return {'stockout': npa_final < 0,
+            'below_ss': npa_final < dict_inputs['ss_inventory'],
+            'below_rp': npa_final < dict_inputs['rp_inventory'],
+            'below_min': npa_final < dict_inputs['demand_min_stock']}
+
+@instrumented
+def simulate(dict_inputs, npa_purchase):
+    # Final inventory and flags of a purchase plan
+    npa_final = roll_forward(dict_inputs['start'], npa_purchase, dict_inputs['demand'])
+    return {'purchase': npa_purchase,
+            'final': npa_final,
+            'flags': flag_months(dict_inputs, npa_final)}
+
+@cached(resource=True, max_entries=SIMULATION_CACHED_VERSIONS)
+def load_base_simulation(table, version):
+    # Simulation of the stored purchase plan, the reference of every edit, shared read-only
+    dict_base = simulate(load_simulation_inputs(table, version), load_simulation_inputs(table, version)['purchase'])
+    dict_base['final'].flags.writeable = False
+    for npa in dict_base['flags'].values():
+        npa.flags.writeable = False
+    return dict_base
+
+def sku_path(dict_inputs, dict_sim, int_sku, companies=None):
+    # Monthly path of one SKU summed over the selected companies, same columns as the planning pages
+    npa_cols = np.array([company in (companies or dict_inputs['companies']) for company in dict_inputs['companies']])
+    dict_path = {}
+    for str_name, npa_values in [('inventory_purchase', dict_sim['purchase']),
+                                 ('inventory_final_new&ra', dict_sim['final']),
+                                 ('demand', dict_inputs['demand']),
+                                 ('rp_inventory', dict_inputs['rp_inventory']),
+                                 ('ss_inventory', dict_inputs['ss_inventory']),
+                                 ('demand_min_stock', dict_inputs['demand_min_stock'])]:
+        dict_path[str_name] = npa_values[int_sku][:, npa_cols].sum(axis=1, dtype=float)
+    df = pd.DataFrame(dict_path, index=pd.Index(dict_inputs['months'], name='year_month'))
+    df.insert(0, 'inventory_initial_new&ra', df['inventory_final_new&ra'] - df['inventory_purchase'] + df['demand'])
+    return df
+
+def _any_company(npa_flag, ls_cols):
+    # (SKU x month) mask of the months flagged for any selected company, one pass per company
+    # is faster than .any over the short last axis
+    npa_any = npa_flag[:, :, ls_cols[0]].copy()
+    for int_col in ls_cols[1:]:
+        np.logical_or(npa_any, npa_flag[:, :, int_col], out=npa_any)
+    return npa_any
+
+@instrumented
+def summarize_simulation(dict_inputs, dict_base, dict_sim, companies=None):
+    # Flagged SKUs and valuations per month for the stored and the edited plan,
+    # and the flagged months of each SKU
+    ls_companies = dict_inputs['companies']
+    ls_cols = [j for j, company in enumerate(ls_companies) if company in (companies or ls_companies)]
+    npa_price = dict_inputs['price'][:, ls_cols]
+
+    dict_months = {}
+    dict_skus = {'sku_family': dict_inputs['sku_family']}
+    for str_name, dict_run in [('base', dict_base), ('whatif', dict_sim)]:
+        for str_flag in FLAGS:
+            npa_flag = _any_company(dict_run['flags'][str_flag], ls_cols)
+            dict_months[f'{str_flag}_{str_name}'] = npa_flag.sum(axis=0)
+            dict_skus[f'{str_flag}_months_{str_name}'] = npa_flag.sum(axis=1)
+            if str_flag == 'below_ss' and str_name == 'whatif':
+                npa_first = npa_flag.argmax(axis=1)
+                dict_skus['first_month_below_ss'] = np.where(npa_flag[np.arange(len(npa_first)), npa_first],
+                                                             dict_inputs['months'][npa_first], '')
+        # inventory on hand, shortages are not valued
+        npa_stock = np.maximum(dict_run['final'][:, :, ls_cols], 0)
+        dict_months[f'inventory_valuation_{str_name}'] = np.einsum('smc,sc->mc', npa_stock, npa_price).sum(axis=1, dtype=float)
+        dict_months[f'purchase_valuation_{str_name}'] = np.einsum('smc,sc->mc', dict_run['purchase'][:, :, ls_cols],
+                                                                  npa_price).sum(axis=1, dtype=float)
+    df_months = pd.DataFrame(dict_months, index=pd.Index(dict_inputs['months'], name='year_month'))
+    df_skus = pd.DataFrame(dict_skus, index=pd.Index(dict_inputs['skus'], name='sku'))
+    return df_months, df_skus
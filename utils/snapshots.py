@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import os
+import re
+import tempfile
+
+import pyarrow as pa
+import pyarrow.ipc
+
+#%% Constants
+
+# MP versions are immutable once written, so a snapshot never goes stale
+SNAPSHOT_DIR = os.environ.get('MP_SNAPSHOT_DIR',
+                              os.path.join(tempfile.gettempdir(), 'mp_snapshots'))
+
+# total size of the store before the least recently used snapshots are evicted
+SNAPSHOT_MAX_BYTES = int(float(os.environ.get('MP_SNAPSHOT_MAX_GB', '5'))*1024**3)
+
+#%% Functions
+
+def snapshot_path(table, version):
+    # One uncompressed Arrow IPC file per (table, version)
+    str_version = re.sub(r'[^0-9A-Za-z_-]', '_', str(version))
+    return os.path.join(SNAPSHOT_DIR, f'{table}__{str_version}.arrow')
+
+def snapshot_exists(table, version):
+    return os.path.exists(snapshot_path(table, version))
+
+def read_snapshot(table, version):
+    # Memory-mapped read: columns are paged in lazily and shared between readers
+    path = snapshot_path(table, version)
+    if not os.path.exists(path):
+        return None
+    # touching the file keeps it at the end of the eviction queue
+    os.utime(path)
+    source = pa.memory_map(path, 'r')
+    return pa.ipc.open_file(source).read_all()
+
+def write_snapshot(table, version, df):
+    # Writing to a temporary file first so readers never see a partial snapshot
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(table, version)
+    tbl = pa.Table.from_pandas(df, preserve_index=False)
+    fd, path_tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as sink:
+            with pa.ipc.new_file(sink, tbl.schema) as writer:
+                writer.write_table(tbl)
+        os.replace(path_tmp, path)
+    except BaseException:
+        os.remove(path_tmp)
+        raise
+    evict_snapshots()
+    return path
+
+def evict_files(str_dir, max_bytes, tpl_suffixes):
+    # Size-based eviction, least recently used files first
+    if not os.path.isdir(str_dir):
+        return []
+
+    ls_files = []
+    for entry in os.scandir(str_dir):
+        if entry.is_file() and entry.name.endswith(tpl_suffixes):
+            stat = entry.stat()
+            ls_files.append((stat.st_mtime, stat.st_size, entry.path))
+    ls_files.sort()
+
+    int_total = sum(size for _, size, _ in ls_files)
+    ls_evicted = []
+    # the most recent file is always kept, even if it alone exceeds the limit
+    for _, size, path in ls_files[:-1]:
+        if int_total <= max_bytes:
+            break
+        # memory-mapped readers keep their pages after the file is unlinked
+        os.remove(path)
+        int_total -= size
+        ls_evicted.append(path)
+    return ls_evicted
+
+def evict_snapshots(max_bytes=None):
+    if max_bytes is None:
+        max_bytes = SNAPSHOT_MAX_BYTES
+    return evict_files(SNAPSHOT_DIR, max_bytes, ('.arrow',))
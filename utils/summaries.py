@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import os
+import re
+
+from sqlalchemy import text
+
+from utils.loaders import SUMMARY_METRICS, check_table, company_states_sql, quote_column
+from utils.schema import COMPANIES, build_company_schema
+
+#%% Constants
+
+SUMMARIES_SQL = os.path.join(os.path.dirname(__file__), '..', 'sql', 'mp_summaries.sql')
+
+# summary tables, deleted and rebuilt per (table, version)
+SUMMARY_TABLES = ['mp_summary_company_month', 'mp_summary_alerts', 'mp_summary_versions']
+
+# version types that can be interpolated into the DDL, such as 'text', 'integer' or 'character varying(7)'
+_VERSION_TYPE_PATTERN = re.compile(r'^[a-z][a-z0-9 _(),]*$')
+
+#%% Functions
+
+def _mp_columns(connection, table):
+    # Same lookup as load_mp_columns, on the caller's connection
+    query = """
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name = :table
+        ORDER BY ordinal_position"""
+    return [row[0] for row in connection.execute(text(query), {"table": check_table(table)})]
+
+def version_type(connection, table):
+    # Postgres type of the version column of a table, the catalog and the summaries store versions with it
+    query = """
+        SELECT format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = to_regclass(:table) AND attname = 'version' AND NOT attisdropped"""
+    str_type = connection.execute(text(query), {"table": table}).scalar()
+    if str_type is None or not _VERSION_TYPE_PATTERN.match(str_type):
+        raise ValueError(f'Unsupported version column in {table}: {str_type!r}')
+    return str_type
+
+def native_version(connection, str_type, version):
+    # Version given as text (command line) as a value of the version type, bound natively afterwards
+    return connection.execute(text(f"SELECT CAST(:version AS {str_type})"), {"version": str(version)}).scalar()
+
+def create_tables(connection, str_sql_path, str_type, ls_tables):
+    # Runs a DDL file with versions of `str_type`, tables created with another version type
+    # (text before versions were typed) are converted
+    with open(str_sql_path) as f:
+        connection.execute(text(f.read().format(version_type=str_type)))
+    for str_table in ls_tables:
+        if version_type(connection, str_table) != str_type:
+            connection.execute(text(f"ALTER TABLE {str_table} ALTER COLUMN version TYPE {str_type} USING version::{str_type}"))
+
+def company_month_sql(table, schema):
+    # One row per (year_month, company) with the summary metrics, companies unpivoted in one scan
+    ls_names = list(SUMMARY_METRICS.values())
+    ls_values = []
+    for str_company in COMPANIES:
+        ls_metrics = [f't.{quote_column(schema[base][str_company])}'
+                      if str_company in schema.get(base, {}) else 'NULL::float'
+                      for base in SUMMARY_METRICS]
+        ls_values.append(f"('{str_company}', {', '.join(ls_metrics)})")
+    str_sums = ', '.join(f'COALESCE(SUM(v.{name}), 0)' for name in ls_names)
+    return f"""
+        INSERT INTO mp_summary_company_month (table_name, version, year, year_month, company, {', '.join(ls_names)})
+        SELECT :table, :version, t.year::text, t.year_month::text, v.company, {str_sums}
+        FROM {check_table(table)} t
+        CROSS JOIN LATERAL (VALUES {', '.join(ls_values)})
+            AS v(company, {', '.join(ls_names)})
+        WHERE t.version = :version
+        GROUP BY t.year, t.year_month, v.company"""
+
+def alerts_sql(table, schema):
+    # Final state per (sku, company), same states as the live Alerts queries
+    return f"""
+        WITH {company_states_sql(table, schema)}
+        INSERT INTO mp_summary_alerts (table_name, version, sku, company, stockouts, near_miss, emergency, final_state)
+        SELECT :table, :version, sku::text, company, stockouts, near_miss, emergency, final_state
+        FROM company_states"""
+
+def refresh_summaries(connection, table, version):
+    # Rebuilds the summaries of a version inside the caller's transaction, `version` is a native value
+    create_tables(connection, SUMMARIES_SQL, version_type(connection, table), SUMMARY_TABLES)
+    schema = build_company_schema(_mp_columns(connection, table))
+    params = {"table": table, "version": version, "versions": [version]}
+    for str_summary in SUMMARY_TABLES:
+        connection.execute(text(f"DELETE FROM {str_summary} WHERE table_name = :table AND version = :version"), params)
+    connection.execute(text(company_month_sql(table, schema)), params)
+    connection.execute(text(alerts_sql(table, schema)), params)
+    # last, so that pages only switch to the summaries of a complete refresh
+    connection.execute(text("INSERT INTO mp_summary_versions (table_name, version) VALUES (:table, :version)"), params)
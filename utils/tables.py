@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+#%% Importing packages
+
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+#%% Constants
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+#%% Functions
+
+def filter_sort_frame(df, str_query=None, sort_by=None, ascending=True):
+    # Filter and sort the whole frame before any slicing, text match over the text columns and the index
+    if str_query:
+        npa_mask = np.zeros(len(df), dtype=bool)
+        ls_text = [df.index.to_series(index=df.index)] if not pd.api.types.is_numeric_dtype(df.index) else []
+        ls_text += [df[col] for col in df.columns
+                    if df[col].dtype == object or isinstance(df[col].dtype, pd.CategoricalDtype)]
+        for s in ls_text:
+            npa_mask |= s.astype(str).str.contains(str_query, case=False, regex=False).to_numpy()
+        df = df[npa_mask]
+    if sort_by:
+        df = df.sort_values(sort_by, ascending=ascending, kind='stable')
+    return df
+
+def page_window(int_page, int_page_size):
+    # (offset, limit) of a 1-based page
+    return (int_page - 1)*int_page_size, int_page_size
+
+def _table_controls(key, ls_sort_columns, int_page_size):
+    col_filter, col_sort, col_order, col_size = st.columns([3, 3, 2, 2])
+    str_query = col_filter.text_input('Filter', key=f'{key}-filter')
+    sort_by = col_sort.selectbox('Sort by', [''] + list(ls_sort_columns), key=f'{key}-sort')
+    ascending = col_order.selectbox('Order', ['ascending', 'descending'], key=f'{key}-order') == 'ascending'
+    int_page_size = col_size.selectbox('Rows per page', PAGE_SIZES,
+                                       index=PAGE_SIZES.index(int_page_size) if int_page_size in PAGE_SIZES else 1,
+                                       key=f'{key}-size')
+    return str_query, sort_by or None, ascending, int_page_size
+
+def _page_number(key, int_total, int_page_size):
+    # Page selector, only shown when there is more than one page
+    int_pages = max(math.ceil(int_total/int_page_size), 1)
+    if int_pages == 1:
+        return 1
+    return st.number_input(f'Page (of {int_pages})', min_value=1, max_value=int_pages, value=1,
+                           step=1, key=f'{key}-page')
+
+def _caption(int_offset, int_rows, int_total):
+    if int_total:
+        st.caption(f'Rows {int_offset + 1}-{int_offset + int_rows} of {int_total}')
+    else:
+        st.caption('No rows')
+
+def render_paged_frame(df, key, int_page_size=50, **kwargs):
+    # st.dataframe of the visible page only, so the browser never receives the whole frame
+    str_query, sort_by, ascending, int_page_size = _table_controls(key, df.columns, int_page_size)
+    df = filter_sort_frame(df, str_query, sort_by, ascending)
+    int_offset, int_limit = page_window(_page_number(key, len(df), int_page_size), int_page_size)
+    df_page = df.iloc[int_offset:int_offset + int_limit]
+    st.dataframe(df_page, **kwargs)
+    _caption(int_offset, len(df_page), len(df))
+    return df_page
+
+def render_paged_query(key, load_count, load_page, ls_sort_columns, int_page_size=50, **kwargs):
+    # Same table, paged by the database:
+    # load_count(str_query) -> rows, load_page(offset, limit, sort_by, ascending, str_query) -> frame
+    str_query, sort_by, ascending, int_page_size = _table_controls(key, ls_sort_columns, int_page_size)
+    int_total = load_count(str_query or None)
+    int_offset, int_limit = page_window(_page_number(key, int_total, int_page_size), int_page_size)
+    df_page = load_page(int_offset, int_limit, sort_by, ascending, str_query or None)
+    st.dataframe(df_page, **kwargs)
+    _caption(int_offset, len(df_page), int_total)
+    return df_page